@@ -1,37 +1,157 @@
-import eventlet
-eventlet.monkey_patch()
-
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_cors import CORS, cross_origin
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, JWTManager
-from flask_socketio import SocketIO, emit
-import datetime
+import contextlib
 import os
+import time
+
+# --- STARTUP PROFILING ---
+# (component, seconds) for every import group and extension init below. Printed by
+# `python app.py --profile-startup`, or by each worker when BMS_PROFILE_STARTUP=1.
+STARTUP_TIMINGS = []
+_module_started = time.perf_counter()
+
+@contextlib.contextmanager
+def startup_step(component):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS.append((component, time.perf_counter() - started))
+
+# "eventlet" (default): green threads, run with gunicorn's eventlet worker or `python app.py`.
+# "asgi": no monkey patching; serve asgi:application with uvicorn (see asgi.py).
+SERVER_MODE = os.environ.get('BMS_SERVER_MODE', 'eventlet')
+if SERVER_MODE == 'eventlet':
+    with startup_step('eventlet.monkey_patch'):
+        import eventlet
+        eventlet.monkey_patch()
+
+with startup_step('import flask'):
+    from flask import Blueprint, Flask, current_app, request, jsonify
+    from flask.json.provider import DefaultJSONProvider
+    from werkzeug.security import generate_password_hash
+with startup_step('import flask_sqlalchemy'):
+    from flask_sqlalchemy import SQLAlchemy
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+with startup_step('import flask_cors'):
+    from flask_cors import CORS, cross_origin
+with startup_step('import flask_jwt_extended'):
+    from flask_jwt_extended import create_access_token, decode_token, get_jwt_identity, jwt_required, JWTManager
+with startup_step('import flask_socketio'):
+    from flask_socketio import SocketIO, ConnectionRefusedError, disconnect, emit
+import bisect
+import click
+import datetime
+import gzip
+import itertools
+import json
+import re
 import secrets
+import sys
+import threading
+
+with startup_step('import local modules'):
+    from passwords import is_bcrypt_hash, verify_password
+    from storage import SQLAlchemyStorage, import_legacy_json
+
+with startup_step('import orjson'):
+    try:
+        import orjson
+    except ImportError:  # optional: fall back to Flask's stdlib-based provider
+        orjson = None
+
+# Extensions are created unbound and attached to the app in create_app(); routes, CLI commands
+# and socket handlers below register against `bp`/`socketio` without needing an app.
+bp = Blueprint('bms', __name__, cli_group=None)
+cors = CORS()
+jwt = JWTManager()
+db = SQLAlchemy()
+socketio = SocketIO()
+
+
+# --- JSON PROVIDER ---
+class FastJSONProvider(DefaultJSONProvider):
+    """Serializes with orjson, keeping Flask's key sorting and its handling of dates,
+    decimals and other types through DefaultJSONProvider.default."""
+    option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:  # callers asking for stdlib options (indent, cls, ...) get the stdlib path
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.option).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option), mimetype=self.mimetype
+        )
 
-app = Flask(__name__)
-
-# --- 1. CORS CONFIGURATION ---
-CORS(app, resources={r"/*": {"origins": "*"}})
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
 
 # --- CONFIGURATION ---
-# FIX #4: JWT secret key now comes from environment variable
-app.config["JWT_SECRET_KEY"] = os.environ.get("JWT_SECRET_KEY", secrets.token_hex(32))
-jwt = JWTManager(app)
-
-# --- POSTGRESQL/SQLITE CONFIGURATION ---
-DATABASE_URL = os.environ.get('DATABASE_URL')
-if DATABASE_URL:
-    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
-    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users_local.db'
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+def load_jwt_secret(app):
+    """JWT_SECRET_KEY from the environment, else a secret persisted in the instance folder.
+
+    Every worker and restart on a host reads the same file, so tokens stay valid across
+    gunicorn workers and deploys. Multi-host deployments must set JWT_SECRET_KEY."""
+    secret = os.environ.get("JWT_SECRET_KEY")
+    if secret:
+        return secret
+    path = os.environ.get("JWT_SECRET_FILE", os.path.join(app.instance_path, "jwt_secret"))
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a private temp file and hard-link it into place: link() fails if another
+        # worker won the race, and nobody can ever read a half-written secret.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path, "r") as f:
+        return f.read().strip()
+
+def configure(app):
+    # FIX #4: JWT secret key now comes from environment variable (or a persisted per-host secret)
+    app.config["JWT_SECRET_KEY"] = load_jwt_secret(app)
+
+    # --- POSTGRESQL/SQLITE CONFIGURATION ---
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url.replace('postgres://', 'postgresql://', 1)
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users_local.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # --- RETENTION CONFIGURATION ---
+    # Chat messages older than RETENTION_DAYS, and complaints resolved longer ago than that, are
+    # moved into ArchiveBatch. RETENTION_MODE is "table" (gzip payload stored in the database)
+    # or "file" (gzip NDJSON on disk, under the instance folder unless RETENTION_ARCHIVE_DIR is absolute).
+    app.config['RETENTION_DAYS'] = int(os.environ.get('RETENTION_DAYS', 180))
+    app.config['RETENTION_BATCH_SIZE'] = int(os.environ.get('RETENTION_BATCH_SIZE', 1000))
+    app.config['RETENTION_MODE'] = os.environ.get('RETENTION_MODE', 'table')
+    app.config['RETENTION_ARCHIVE_DIR'] = os.path.join(app.instance_path, os.environ.get('RETENTION_ARCHIVE_DIR', 'archive'))
+    app.config['RETENTION_INTERVAL_HOURS'] = float(os.environ.get('RETENTION_INTERVAL_HOURS', 0))  # 0 = no scheduled job
+    app.config['RETENTION_PARTITIONING'] = os.environ.get('RETENTION_PARTITIONING') == '1'  # PostgreSQL only
+    # ChangeLog entries older than this are compacted away; clients syncing from before then get a full snapshot
+    app.config['CHANGELOG_RETENTION_DAYS'] = int(os.environ.get('CHANGELOG_RETENTION_DAYS', 90))
+
+    # Sockets whose JWT has expired are disconnected within this many seconds, even if idle
+    app.config['SOCKET_SWEEP_SECONDS'] = float(os.environ.get('SOCKET_SWEEP_SECONDS', 30))
+
+    # --- SAMPLING PROFILER ---
+    # Off unless PROFILER_SAMPLE_RATE (profile 1 request in N) or PROFILER_HEADER_TOKEN is set.
+    app.config['PROFILER_SAMPLE_RATE'] = int(os.environ.get('PROFILER_SAMPLE_RATE', 0))
+    app.config['PROFILER_HEADER_TOKEN'] = os.environ.get('PROFILER_HEADER_TOKEN')  # value for X-BMS-Profile
+    app.config['PROFILER_INTERVAL_MS'] = float(os.environ.get('PROFILER_INTERVAL_MS', 5))
+    app.config['PROFILER_MAX_CONCURRENT'] = int(os.environ.get('PROFILER_MAX_CONCURRENT', 1))
+    app.config['PROFILER_MAX_STACKS'] = int(os.environ.get('PROFILER_MAX_STACKS', 5000))
+
+    # Worker boot (module import + create_app) above this logs a warning and fails --profile-startup
+    app.config['STARTUP_BUDGET_MS'] = float(os.environ.get('BMS_STARTUP_BUDGET_MS', 2000))
 
 
 # --- MODELS ---
@@ -50,7 +170,7 @@ class User(db.Model):
 class Apartment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     unit_number = db.Column(db.String(10), unique=True, nullable=False)
-    floor = db.Column(db.Integer)
+    floor = db.Column(db.Integer, index=True)
     resident_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=True)
 
 class Notice(db.Model):
@@ -75,6 +195,23 @@ class Complaint(db.Model):
     description = db.Column(db.Text, nullable=False)
     status = db.Column(db.String(20), default='Pending')
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)  # FIX #1
+    resolved_at = db.Column(db.DateTime, nullable=True)
+    # Submitter's flat at the time of the complaint, so rollups don't depend on later reassignment
+    floor = db.Column(db.Integer, nullable=True)
+    unit_number = db.Column(db.String(10), nullable=True)
+
+class ComplaintDailyStat(db.Model):
+    # Pre-aggregated complaint counters maintained by post_complaint/update_complaint.
+    # `created`: complaints created on `day` that are currently in `status`.
+    # `resolved`/`resolution_seconds`: complaints resolved on `day` (status 'Resolved' rows only).
+    # floor is 0 and unit_number '' when the submitter had no flat.
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    floor = db.Column(db.Integer, primary_key=True)
+    unit_number = db.Column(db.String(10), primary_key=True)
+    created = db.Column(db.Integer, default=0, nullable=False)
+    resolved = db.Column(db.Integer, default=0, nullable=False)
+    resolution_seconds = db.Column(db.Float, default=0, nullable=False)
 
 class ChatMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -83,9 +220,94 @@ class ChatMessage(db.Model):
     text = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)  # FIX #1
 
+class ArchiveBatch(db.Model):
+    # One row per batch of archived ChatMessage/Complaint rows. The rows themselves are kept
+    # as gzip NDJSON, either inline in `payload` or in a file under RETENTION_ARCHIVE_DIR.
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False, index=True)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    min_ts = db.Column(db.DateTime, nullable=False)
+    max_ts = db.Column(db.DateTime, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=True)
+    file_path = db.Column(db.String(500), nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+class ChangeLog(db.Model):
+    # Append-only log of writes to synced entities; `id` is the cursor handed out by /api/sync.
+    # audience_user_id limits a change to one user (their complaints and private notices).
+    # (entity, id) serves "newest change of one entity" (VacancyIndex._head) from the index alone.
+    __table_args__ = (db.Index('ix_change_log_entity_id', 'entity', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # 'upsert' or 'delete'
+    audience_user_id = db.Column(db.Integer, nullable=True, index=True)
+    changed_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+class ChangeLogCompaction(db.Model):
+    # One row per compaction: ChangeLog ids <= low_water have been (or are being) deleted, so the
+    # highest low_water is the oldest cursor /api/sync can still answer with a delta.
+    id = db.Column(db.Integer, primary_key=True)
+    low_water = db.Column(db.Integer, nullable=False)
+    compacted_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+# --- SERIALIZERS ---
+# List responses are built from (key, column) schemas and fetched with with_entities(), so
+# no ORM objects are materialized and DateTime columns are formatted once per distinct day.
+NOTICE_SCHEMA = (
+    ("id", Notice.id), ("title", Notice.title), ("content", Notice.content), ("date_posted", Notice.created_at)
+)
+PRIVATE_NOTICE_SCHEMA = (
+    ("id", PrivateNotice.id), ("title", PrivateNotice.title), ("content", PrivateNotice.content),
+    ("date", PrivateNotice.created_at)
+)
+COMPLAINT_SCHEMA = (
+    ("id", Complaint.id), ("submitted_by", Complaint.submitted_by), ("subject", Complaint.subject),
+    ("description", Complaint.description), ("status", Complaint.status), ("date", Complaint.created_at)
+)
+RESIDENT_SCHEMA = (
+    ("id", User.id), ("name", User.full_name), ("email", User.email), ("phone", User.phone), ("nid", User.nid),
+    ("flat", db.func.coalesce(Apartment.unit_number, "Not Assigned")), ("members", User.members_count)
+)
+
+def resident_query():
+    return User.query.outerjoin(Apartment, Apartment.resident_id == User.id)
+
+def _format_dates(values):
+    """Formats a column of datetimes as YYYY-MM-DD, formatting each distinct day once."""
+    cache = {}
+    out = []
+    for v in values:
+        if v is None:
+            out.append(None)
+            continue
+        key = v.toordinal()
+        text = cache.get(key)
+        if text is None:
+            text = cache[key] = v.date().isoformat()
+        out.append(text)
+    return out
+
+def serialize_rows(schema, query):
+    """Runs `query` restricted to the schema's columns and returns a list of dicts."""
+    keys = tuple(key for key, _ in schema)
+    rows = query.with_entities(*(column for _, column in schema)).all()
+    if not rows:
+        return []
+    date_columns = [i for i, (_, column) in enumerate(schema) if isinstance(column.type, db.DateTime)]
+    if date_columns:
+        columns = list(zip(*rows))
+        for i in date_columns:
+            columns[i] = _format_dates(columns[i])
+        rows = zip(*columns)
+    return [dict(zip(keys, row)) for row in rows]
+
 
 # --- AUTH ROUTES ---
-@app.route('/login', methods=['POST', 'OPTIONS'])
+@bp.route('/login', methods=['POST', 'OPTIONS'])
 @cross_origin()
 def login():
     data = request.json
@@ -99,7 +321,11 @@ def login():
         return jsonify({"status": "error", "message": "Email and password are required"}), 400
 
     user = User.query.filter_by(email=email).first()
-    if user and check_password_hash(user.password_hash, password):
+    if user and verify_password(user.password_hash, password):
+        if is_bcrypt_hash(user.password_hash):
+            # Imported from the CLI's data.json: upgrade to a Werkzeug hash now that we have the password
+            user.password_hash = generate_password_hash(password)
+            db.session.commit()
         token = create_access_token(identity=user.email)
         return jsonify({
             "status": "success",
@@ -112,7 +338,7 @@ def login():
     return jsonify({"status": "error", "message": "Invalid Email or Password"}), 401
 
 
-@app.route("/api/change_password", methods=['POST'])
+@bp.route("/api/change_password", methods=['POST'])
 @jwt_required()
 def change_password():
     user_email = get_jwt_identity()
@@ -122,7 +348,7 @@ def change_password():
     if not data or not data.get('old_password') or not data.get('new_password'):  # FIX #3
         return jsonify({"message": "old_password and new_password are required"}), 400
 
-    if not check_password_hash(user.password_hash, data.get('old_password')):
+    if not verify_password(user.password_hash, data.get('old_password')):
         return jsonify({"message": "Incorrect old password"}), 401
 
     user.password_hash = generate_password_hash(data.get('new_password'))
@@ -132,7 +358,7 @@ def change_password():
 
 
 # --- API ROUTES ---
-@app.route("/api/user_info", methods=['GET'])
+@bp.route("/api/user_info", methods=['GET'])
 @jwt_required()
 def get_user_info():
     user_email = get_jwt_identity()
@@ -152,7 +378,7 @@ def get_user_info():
         "must_change_password": user.must_change_password  # FIX #5
     })
 
-@app.route("/api/stats", methods=['GET'])
+@bp.route("/api/stats", methods=['GET'])
 def get_stats():
     total_flats = Apartment.query.count()
     vacant_flats = Apartment.query.filter_by(resident_id=None).count()
@@ -169,13 +395,12 @@ def get_stats():
 
 
 # --- NOTICE ROUTES ---
-@app.route("/api/notices", methods=['GET'])
+@bp.route("/api/notices", methods=['GET'])
 def get_notices():
-    notices = Notice.query.order_by(Notice.created_at.desc()).all()
-    output = [{"id": n.id, "title": n.title, "content": n.content, "date_posted": n.created_at.strftime("%Y-%m-%d")} for n in notices]
+    output = serialize_rows(NOTICE_SCHEMA, Notice.query.order_by(Notice.created_at.desc()))
     return jsonify(output)
 
-@app.route("/api/notices/<int:id>", methods=['DELETE'])
+@bp.route("/api/notices/<int:id>", methods=['DELETE'])
 @jwt_required()
 def delete_notice(id):
     current_user = User.query.filter_by(email=get_jwt_identity()).first()
@@ -185,13 +410,14 @@ def delete_notice(id):
     notice = db.session.get(Notice, id)
     if notice:
         db.session.delete(notice)
+        record_change('notice', notice.id, 'delete')
         db.session.commit()
         return jsonify({"status": "success", "message": "Notice deleted"})
     return jsonify({"message": "Notice not found"}), 404
 
 
 # --- PRIVATE NOTICE ROUTES ---
-@app.route("/api/admin/private_notice", methods=['POST'])
+@bp.route("/api/admin/private_notice", methods=['POST'])
 @jwt_required()
 def send_private_notice():
     current_user = User.query.filter_by(email=get_jwt_identity()).first()
@@ -209,42 +435,35 @@ def send_private_notice():
         content=data.get('content')
     )
     db.session.add(new_notice)
+    db.session.flush()
+    record_change('private_notice', new_notice.id, 'upsert', audience_user_id=new_notice.user_id)
     db.session.commit()
     return jsonify({"status": "success", "message": "Private notice sent!"})
 
-@app.route("/api/my_private_notices", methods=['GET'])
+@bp.route("/api/my_private_notices", methods=['GET'])
 @jwt_required()
 def get_my_private_notices():
     user_email = get_jwt_identity()
     user = User.query.filter_by(email=user_email).first()
-    notices = PrivateNotice.query.filter_by(user_id=user.id).order_by(PrivateNotice.created_at.desc()).all()
-    output = [{"id": n.id, "title": n.title, "content": n.content, "date": n.created_at.strftime("%Y-%m-%d")} for n in notices]
+    notices = PrivateNotice.query.filter_by(user_id=user.id).order_by(PrivateNotice.created_at.desc())
+    output = serialize_rows(PRIVATE_NOTICE_SCHEMA, notices)
     return jsonify(output)
 
 
 # --- COMPLAINT ROUTES ---
-@app.route("/api/complaints", methods=['GET'])
+@bp.route("/api/complaints", methods=['GET'])
 @jwt_required()
 def get_complaints():
     current_user = User.query.filter_by(email=get_jwt_identity()).first()
     # FIX #7: residents only see their own complaints; admins see all
     if current_user.role == 'admin':
-        complaints = Complaint.query.order_by(Complaint.created_at.desc()).all()
+        complaints = Complaint.query.order_by(Complaint.created_at.desc())
     else:
-        complaints = Complaint.query.filter_by(user_id=current_user.id).order_by(Complaint.created_at.desc()).all()
-    output = [
-        {
-            "id": c.id,
-            "submitted_by": c.submitted_by,
-            "subject": c.subject,
-            "description": c.description,
-            "status": c.status,
-            "date": c.created_at.strftime("%Y-%m-%d")
-        } for c in complaints
-    ]
+        complaints = Complaint.query.filter_by(user_id=current_user.id).order_by(Complaint.created_at.desc())
+    output = serialize_rows(COMPLAINT_SCHEMA, complaints)
     return jsonify(output)
 
-@app.route("/api/complaints", methods=['POST'])
+@bp.route("/api/complaints", methods=['POST'])
 @jwt_required()
 def post_complaint():
     user_email = get_jwt_identity()
@@ -258,13 +477,20 @@ def post_complaint():
         user_id=user.id,  # FIX #7: store real user_id
         submitted_by=user.full_name,
         subject=data.get('subject'),
-        description=data.get('description')
+        description=data.get('description'),
+        status='Pending',
+        created_at=datetime.datetime.utcnow(),
+        floor=user.apartment.floor if user.apartment else None,
+        unit_number=user.apartment.unit_number if user.apartment else None
     )
     db.session.add(new_complaint)
+    bump_complaint_stat(new_complaint.created_at.date(), new_complaint, created=1)
+    db.session.flush()
+    record_change('complaint', new_complaint.id, 'upsert', audience_user_id=new_complaint.user_id)
     db.session.commit()
     return jsonify({"status": "success", "message": "Complaint submitted"})
 
-@app.route("/api/complaints/<int:id>", methods=['PUT'])
+@bp.route("/api/complaints/<int:id>", methods=['PUT'])
 @jwt_required()
 def update_complaint(id):
     current_user = User.query.filter_by(email=get_jwt_identity()).first()
@@ -274,12 +500,28 @@ def update_complaint(id):
     complaint = db.session.get(Complaint, id)
     if not complaint:
         return jsonify({"message": "Complaint not found"}), 404
-    data = request.json
-    complaint.status = data.get('status', 'Resolved')
+    data = request.json or {}
+    old_status = complaint.status
+    new_status = data.get('status', 'Resolved')
+    if new_status != old_status:
+        created_day = complaint.created_at.date()
+        bump_complaint_stat(created_day, complaint, status=old_status, created=-1)
+        bump_complaint_stat(created_day, complaint, status=new_status, created=1)
+        if new_status == 'Resolved':
+            complaint.resolved_at = datetime.datetime.utcnow()
+            bump_complaint_stat(complaint.resolved_at.date(), complaint, status='Resolved', resolved=1,
+                                resolution_seconds=(complaint.resolved_at - complaint.created_at).total_seconds())
+        elif old_status == 'Resolved' and complaint.resolved_at:
+            # Reopened: take the earlier resolution back out of the rollup
+            bump_complaint_stat(complaint.resolved_at.date(), complaint, status='Resolved', resolved=-1,
+                                resolution_seconds=-(complaint.resolved_at - complaint.created_at).total_seconds())
+            complaint.resolved_at = None
+        complaint.status = new_status
+        record_change('complaint', complaint.id, 'upsert', audience_user_id=complaint.user_id)
     db.session.commit()
     return jsonify({"status": "success", "message": f"Complaint marked as {complaint.status}"})
 
-@app.route("/api/messages", methods=['GET'])
+@bp.route("/api/messages", methods=['GET'])
 @jwt_required()
 def get_messages():
     current_user_email = get_jwt_identity()
@@ -293,8 +535,351 @@ def get_messages():
     return jsonify(output)
 
 
+# --- COMPLAINT ANALYTICS ---
+def bump_complaint_stat(day, complaint, status=None, **deltas):
+    """Adds `deltas` to the ComplaintDailyStat row for (day, status, complaint's flat) with a single
+    upsert, inside the caller's transaction."""
+    insert = pg_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert
+    keys = {
+        "day": day,
+        "status": status or complaint.status or 'Pending',
+        "floor": complaint.floor or 0,
+        "unit_number": complaint.unit_number or ''
+    }
+    stmt = insert(ComplaintDailyStat).values(**keys, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: getattr(ComplaintDailyStat, name) + delta for name, delta in deltas.items()}
+    )
+    db.session.execute(stmt)
+
+def rebuild_complaint_stats():
+    """Recomputes ComplaintDailyStat from the Complaint table in one transaction. Complaint writes
+    wait until it commits, so a complaint posted meanwhile is counted exactly once (by its own
+    bump, after the rebuild). Archived complaints are not re-counted."""
+    if db.engine.dialect.name == 'postgresql':
+        # SHARE blocks inserts/updates of complaints but not reads; SQLite's write lock, taken
+        # by the DELETE below, already does the same there.
+        db.session.execute(db.text("LOCK TABLE complaint IN SHARE MODE"))
+    ComplaintDailyStat.query.delete()
+    last_id = 0
+    while True:
+        complaints = Complaint.query.filter(Complaint.id > last_id).order_by(Complaint.id.asc()).limit(1000).all()
+        if not complaints:
+            break
+        for c in complaints:
+            _count_complaint(c)
+        last_id = complaints[-1].id
+        db.session.flush()
+        db.session.expunge_all()
+    db.session.commit()
+
+def _count_complaint(c):
+    """Adds one pre-existing complaint to the rollup, backfilling its flat from the submitter."""
+    if c.floor is None and c.user_id:
+        submitter = db.session.get(User, c.user_id)
+        if submitter and submitter.apartment:
+            c.floor = submitter.apartment.floor
+            c.unit_number = submitter.apartment.unit_number
+    created_at = c.created_at or datetime.datetime.utcnow()
+    bump_complaint_stat(created_at.date(), c, created=1)
+    if c.status == 'Resolved' and c.resolved_at:
+        bump_complaint_stat(c.resolved_at.date(), c, status='Resolved', resolved=1,
+                            resolution_seconds=(c.resolved_at - created_at).total_seconds())
+
+@bp.cli.command('rebuild-analytics')
+def rebuild_analytics_command():
+    """Rebuild the complaint rollup table from scratch."""
+    rebuild_complaint_stats()
+    click.echo("Complaint analytics rebuilt")
+
+@bp.route("/api/admin/analytics", methods=['GET'])
+@jwt_required()
+def get_complaint_analytics():
+    current_user = User.query.filter_by(email=get_jwt_identity()).first()
+    if current_user.role != 'admin':
+        return jsonify({"message": "Unauthorized"}), 403
+
+    today = datetime.datetime.utcnow().date()
+    try:
+        end = datetime.date.fromisoformat(request.args['to']) if request.args.get('to') else today
+        start = datetime.date.fromisoformat(request.args['from']) if request.args.get('from') else end - datetime.timedelta(days=29)
+    except ValueError:
+        return jsonify({"message": "from and to must be dates (YYYY-MM-DD)"}), 400
+    if start > end:
+        return jsonify({"message": "from must not be after to"}), 400
+
+    stat = ComplaintDailyStat
+    filters = [stat.day >= start, stat.day <= end]
+    floor = request.args.get('floor', type=int)
+    if floor is not None:
+        filters.append(stat.floor == floor)
+    total = db.func.coalesce(db.func.sum(stat.created), 0)
+
+    per_day = db.session.query(stat.day, total).filter(*filters).group_by(stat.day).order_by(stat.day).all()
+    by_status = db.session.query(stat.status, total).filter(*filters).group_by(stat.status).all()
+    busiest = (
+        db.session.query(stat.unit_number, total.label('n'))
+        .filter(*filters, stat.unit_number != '')
+        .group_by(stat.unit_number)
+        .order_by(db.desc('n'))
+        .limit(5)
+        .all()
+    )
+    resolved, resolution_seconds = db.session.query(
+        db.func.coalesce(db.func.sum(stat.resolved), 0),
+        db.func.coalesce(db.func.sum(stat.resolution_seconds), 0)
+    ).filter(*filters).one()
+
+    return jsonify({
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "per_day": [{"date": day.isoformat(), "count": int(count)} for day, count in per_day],
+        "by_status": {status: int(count) for status, count in by_status if count},
+        "busiest_flats": [{"flat": unit, "count": int(count)} for unit, count in busiest if count],
+        "resolved": int(resolved),
+        "mean_hours_to_resolve": round(resolution_seconds / resolved / 3600, 2) if resolved else None
+    })
+
+
+# --- DELTA SYNC ---
+# entity -> (base query, schema). Admin-only entities are filtered in get_sync.
+SYNC_ENTITIES = {
+    "notice": (lambda: Notice.query, NOTICE_SCHEMA),
+    "private_notice": (lambda: PrivateNotice.query, PRIVATE_NOTICE_SCHEMA),
+    "complaint": (lambda: Complaint.query, COMPLAINT_SCHEMA),
+    "user": (resident_query, RESIDENT_SCHEMA),
+}
+
+def lock_change_log():
+    if db.engine.dialect.name == 'postgresql':
+        # Serialize change-log writers so ids commit in order and a client holding cursor N
+        # can never later see a change with id < N appear. Released on commit/rollback.
+        db.session.execute(db.text("SELECT pg_advisory_xact_lock(7291001)"))
+
+def record_change(entity, entity_id, op, audience_user_id=None):
+    """Appends to ChangeLog inside the caller's transaction and returns the entry."""
+    lock_change_log()
+    change = ChangeLog(entity=entity, entity_id=entity_id, op=op, audience_user_id=audience_user_id)
+    db.session.add(change)
+    return change
+
+def change_log_low_water():
+    return db.session.query(db.func.coalesce(db.func.max(ChangeLogCompaction.low_water), 0)).scalar()
+
+def compact_change_log(days=None, batch_size=None):
+    """Deletes ChangeLog entries older than `days`, one transaction per batch. The low-water
+    cursor is raised and committed before anything is deleted, so a client whose cursor falls
+    in the deleted range gets a full snapshot rather than an incomplete delta.
+    Returns the number of entries removed, or None if another process holds the retention lock
+    (every worker's retention job calls this)."""
+    days = days if days is not None else current_app.config['CHANGELOG_RETENTION_DAYS']
+    batch_size = batch_size or current_app.config['RETENTION_BATCH_SIZE']
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+
+    with retention_lock() as acquired:
+        if not acquired:
+            return None
+        low_water = change_log_low_water()
+        newest_expired = db.session.query(db.func.max(ChangeLog.id)).filter(ChangeLog.changed_at < cutoff).scalar()
+        if newest_expired is not None and newest_expired > low_water:
+            low_water = newest_expired
+            db.session.add(ChangeLogCompaction(low_water=low_water))
+            db.session.commit()
+
+        removed = 0
+        while True:
+            ids = [i for (i,) in db.session.query(ChangeLog.id).filter(ChangeLog.id <= low_water).limit(batch_size)]
+            if not ids:
+                break
+            removed += ChangeLog.query.filter(ChangeLog.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+        return removed
+
+def _visible_changes(query, user):
+    """Restricts a ChangeLog query to what `user` may see."""
+    if user.role == 'admin':
+        return query.filter(db.or_(
+            ChangeLog.entity != 'private_notice',
+            ChangeLog.audience_user_id == user.id
+        ))
+    return query.filter(db.or_(
+        ChangeLog.entity == 'notice',
+        db.and_(ChangeLog.entity.in_(['complaint', 'private_notice']), ChangeLog.audience_user_id == user.id)
+    ))
+
+def _sync_snapshot(user):
+    """Full current state for a client that has no cursor yet."""
+    snapshot = {
+        "notice": Notice.query,
+        "private_notice": PrivateNotice.query.filter_by(user_id=user.id),
+    }
+    if user.role == 'admin':
+        snapshot["complaint"] = Complaint.query
+        snapshot["user"] = resident_query().filter(User.role == 'resident')
+    else:
+        snapshot["complaint"] = Complaint.query.filter_by(user_id=user.id)
+    return {
+        entity: {"upserted": serialize_rows(SYNC_ENTITIES[entity][1], query), "deleted": []}
+        for entity, query in snapshot.items()
+    }
+
+@bp.route("/api/sync", methods=['GET'])
+@jwt_required()
+def get_sync():
+    current_user = User.query.filter_by(email=get_jwt_identity()).first()
+    since = request.args.get('since', type=int)
+    low_water = change_log_low_water()
+    # Never hand out a cursor below the low-water mark, even if compaction emptied the log
+    cursor = max(db.session.query(db.func.coalesce(db.func.max(ChangeLog.id), 0)).scalar(), low_water)
+
+    # A cursor older than the last compaction may have missed deleted entries: resend everything
+    if since is None or since < low_water:
+        return jsonify({"cursor": cursor, "full": True, "changes": _sync_snapshot(current_user)})
+
+    changes = (
+        _visible_changes(ChangeLog.query, current_user)
+        .filter(ChangeLog.id > since, ChangeLog.id <= cursor)
+        .order_by(ChangeLog.id.asc())
+        .all()
+    )
+    if since < change_log_low_water():  # a compaction committed while the changes were read
+        return jsonify({"cursor": cursor, "full": True, "changes": _sync_snapshot(current_user)})
+    # Only the latest operation per record matters
+    latest = {}
+    for change in changes:
+        latest[(change.entity, change.entity_id)] = change.op
+
+    output = {}
+    for entity, (base_query, schema) in SYNC_ENTITIES.items():
+        upsert_ids = [eid for (e, eid), op in latest.items() if e == entity and op == 'upsert']
+        deleted = [eid for (e, eid), op in latest.items() if e == entity and op == 'delete']
+        id_column = schema[0][1]
+        upserted = serialize_rows(schema, base_query().filter(id_column.in_(upsert_ids))) if upsert_ids else []
+        if upserted or deleted:
+            output[entity] = {"upserted": upserted, "deleted": deleted}
+    return jsonify({"cursor": cursor, "full": False, "changes": output})
+
+
+# --- VACANCY INDEX ---
+def natural_unit_key(unit_number):
+    """Sort key that orders "2A" before "10A"."""
+    return tuple(int(part) if part.isdigit() else part for part in re.split(r"(\d+)", unit_number))
+
+class VacancyIndex:
+    """Per-process cache of vacant flats, naturally sorted and grouped by floor.
+
+    Built when the worker starts. Every resident change is logged in ChangeLog as a 'user'
+    entry, and the index is stamped with the newest one it reflects; when another worker's
+    change moves that past the stamp, the next read rebuilds. Other ChangeLog traffic (notices,
+    complaints) doesn't. add_family/remove_family update it in place and advance the stamp to
+    their own change, unless another resident change slipped in before it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._floors = {}  # floor -> [(sort key, unit_number, apartment id)], sorted
+        self._version = None
+
+    def _head(self):
+        return (
+            db.session.query(db.func.coalesce(db.func.max(ChangeLog.id), 0))
+            .filter(ChangeLog.entity == 'user')
+            .scalar()
+        )
+
+    def rebuild(self):
+        # Head first: a change committed while the rows are read then leaves the index marked stale
+        # and is picked up on the next read, instead of being stamped as already included.
+        version = self._head()
+        rows = (
+            Apartment.query.filter(Apartment.resident_id.is_(None))
+            .with_entities(Apartment.id, Apartment.unit_number, Apartment.floor)
+            .all()
+        )
+        floors = {}
+        for apartment_id, unit, floor in rows:
+            floors.setdefault(floor, []).append((natural_unit_key(unit), unit, apartment_id))
+        for units in floors.values():
+            units.sort()
+        with self._lock:
+            self._floors = floors
+            self._version = version
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def _fresh(self):
+        if self._version is None or self._version != self._head():
+            self.rebuild()
+
+    def _entries(self, floor=None):
+        self._fresh()
+        with self._lock:
+            if floor is not None:
+                return list(self._floors.get(floor, []))
+            return sorted(entry for units in self._floors.values() for entry in units)
+
+    def units(self, floor=None):
+        return [unit for _, unit, _ in self._entries(floor)]
+
+    def candidates(self, floor=None):
+        return [apartment_id for _, _, apartment_id in self._entries(floor)]
+
+    def _advance(self, change_id):
+        """Moves the stamp to `change_id` (called with the lock held) if no other resident change
+        was committed since the current stamp; ChangeLog ids commit in order."""
+        version = self._version
+        if version is None:
+            return
+        between = ChangeLog.query.filter(ChangeLog.entity == 'user', ChangeLog.id > version, ChangeLog.id < change_id)
+        if not db.session.query(between.exists()).scalar():
+            self._version = change_id
+
+    def add(self, apartment, change_id):
+        """Marks `apartment` vacant after the committed ChangeLog entry `change_id` freed it."""
+        entry = (natural_unit_key(apartment.unit_number), apartment.unit_number, apartment.id)
+        with self._lock:
+            bisect.insort(self._floors.setdefault(apartment.floor, []), entry)
+            self._advance(change_id)
+
+    def remove(self, apartment, change_id):
+        """Marks `apartment` taken after the committed ChangeLog entry `change_id` assigned it."""
+        entry = (natural_unit_key(apartment.unit_number), apartment.unit_number, apartment.id)
+        with self._lock:
+            units = self._floors.get(apartment.floor, [])
+            i = bisect.bisect_left(units, entry)
+            if i < len(units) and units[i] == entry:
+                del units[i]
+            self._advance(change_id)
+
+vacancy_index = VacancyIndex()
+
+def claim_apartment(apartment_id, user_id):
+    """Atomically assigns a vacant flat to `user_id` inside the caller's transaction.
+    Returns the Apartment, or None if it is taken or locked by a concurrent claim."""
+    vacant = Apartment.query.filter(Apartment.id == apartment_id, Apartment.resident_id.is_(None))
+    # PostgreSQL: skip a flat another onboarding already holds instead of waiting on it.
+    # SQLite ignores FOR UPDATE; the conditional UPDATE below is what makes the claim atomic there.
+    apartment = vacant.with_for_update(skip_locked=True).first()
+    if apartment is None:
+        return None
+    if vacant.update({Apartment.resident_id: user_id}, synchronize_session=False) != 1:
+        return None
+    db.session.refresh(apartment)
+    return apartment
+
+def claim_next_vacant_apartment(user_id, floor=None):
+    """Claims the first free flat in natural order (optionally on `floor`) for `user_id`."""
+    for apartment_id in vacancy_index.candidates(floor):
+        apartment = claim_apartment(apartment_id, user_id)
+        if apartment is not None:
+            return apartment
+    return None
+
+
 # --- ADMIN ROUTES ---
-@app.route("/api/admin/add_family", methods=['POST'])
+@bp.route("/api/admin/add_family", methods=['POST'])
 @jwt_required()
 def add_family():
     current_user = User.query.filter_by(email=get_jwt_identity()).first()
@@ -303,20 +888,24 @@ def add_family():
 
     data = request.json
     # FIX #3: input validation
-    required_fields = ['flat', 'first_name', 'last_name', 'phone', 'nid', 'members']
+    # 'flat' is optional: without it (or with "auto") the next vacant flat is claimed, optionally on 'floor'
+    required_fields = ['first_name', 'last_name', 'phone', 'nid', 'members']
     if not data or not all(data.get(f) for f in required_fields):
         return jsonify({"message": f"Missing required fields: {', '.join(required_fields)}"}), 400
 
-    flat_no = data.get('flat').upper()
-    apartment = Apartment.query.filter_by(unit_number=flat_no).first()
-    if not apartment:
-        return jsonify({"message": f"Flat {flat_no} does not exist."}), 404
-    if apartment.resident_id:
-        return jsonify({"message": f"Flat {flat_no} is already occupied."}), 400
+    try:
+        floor = int(data['floor']) if data.get('floor') not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({"message": "floor must be a number"}), 400
 
-    generated_email = f"{flat_no.lower()}@bms.com"
-    if User.query.filter_by(email=generated_email).first():
-        return jsonify({"message": "Flat account already exists."}), 409
+    flat_no = (data.get('flat') or 'auto').upper()
+    apartment = None
+    if flat_no != 'AUTO':
+        apartment = Apartment.query.filter_by(unit_number=flat_no).first()
+        if not apartment:
+            return jsonify({"message": f"Flat {flat_no} does not exist."}), 404
+        if apartment.resident_id:
+            return jsonify({"message": f"Flat {flat_no} is already occupied."}), 400
 
     full_name = f"{data.get('first_name')} {data.get('last_name')}"
 
@@ -325,7 +914,8 @@ def add_family():
 
     new_user = User(
         full_name=full_name,
-        email=generated_email,
+        # Real address depends on the flat, which is only known once the claim below succeeds
+        email=f"pending-{secrets.token_hex(8)}@bms.com",
         password_hash=generate_password_hash(default_pw),
         phone=data.get('phone'),
         nid=data.get('nid'),
@@ -334,9 +924,31 @@ def add_family():
         must_change_password=True  # FIX #5: enforce password change on first login
     )
     db.session.add(new_user)
+    db.session.flush()
+
+    # Claim and create the account in one transaction so concurrent onboarding can't double-assign
+    if apartment is not None:
+        apartment = claim_apartment(apartment.id, new_user.id)
+        if apartment is None:
+            db.session.rollback()
+            return jsonify({"message": f"Flat {flat_no} is already occupied."}), 400
+    else:
+        apartment = claim_next_vacant_apartment(new_user.id, floor=floor)
+        if apartment is None:
+            db.session.rollback()
+            return jsonify({"message": "No vacant flats available."}), 409
+        flat_no = apartment.unit_number
+
+    generated_email = f"{flat_no.lower()}@bms.com"
+    if User.query.filter_by(email=generated_email).first():
+        db.session.rollback()
+        return jsonify({"message": "Flat account already exists."}), 409
+    new_user.email = generated_email
+    change = record_change('user', new_user.id, 'upsert')
+    db.session.flush()
+    change_id = change.id
     db.session.commit()
-    apartment.resident_id = new_user.id
-    db.session.commit()
+    vacancy_index.remove(apartment, change_id)
 
     # Return the generated password ONCE so the admin can hand it to the resident
     return jsonify({
@@ -345,7 +957,7 @@ def add_family():
         "temp_password": default_pw  # FIX #5: shown once, must be changed on login
     })
 
-@app.route("/api/admin/notices", methods=['POST'])
+@bp.route("/api/admin/notices", methods=['POST'])
 @jwt_required()
 def post_notice():
     current_user = User.query.filter_by(email=get_jwt_identity()).first()
@@ -359,40 +971,26 @@ def post_notice():
 
     new_notice = Notice(title=data['title'], content=data['content'])
     db.session.add(new_notice)
+    db.session.flush()
+    record_change('notice', new_notice.id, 'upsert')
     db.session.commit()
     return jsonify({"status": "success", "message": "Notice posted"})
 
-@app.route("/api/apartments/vacant", methods=['GET'])
+@bp.route("/api/apartments/vacant", methods=['GET'])
 def get_vacant_flats():
-    vacant = Apartment.query.filter_by(resident_id=None).all()
-    flats = [apt.unit_number for apt in vacant]
-    flats.sort()
+    flats = vacancy_index.units(floor=request.args.get('floor', type=int))
     return jsonify(flats)
 
-@app.route("/api/admin/users", methods=['GET'])
+@bp.route("/api/admin/users", methods=['GET'])
 @jwt_required()
 def get_all_residents():
     current_user = User.query.filter_by(email=get_jwt_identity()).first()
     if current_user.role != 'admin':
         return jsonify({"message": "Unauthorized"}), 403
-    residents = User.query.filter_by(role='resident').all()
-    output = []
-    for r in residents:
-        flat = "Not Assigned"
-        if r.apartment:
-            flat = r.apartment.unit_number
-        output.append({
-            "id": r.id,
-            "name": r.full_name,
-            "email": r.email,
-            "phone": r.phone,
-            "nid": r.nid,
-            "flat": flat,
-            "members": r.members_count
-        })
+    output = serialize_rows(RESIDENT_SCHEMA, resident_query().filter(User.role == 'resident'))
     return jsonify(output)
 
-@app.route("/api/admin/user/<int:user_id>", methods=['DELETE'])
+@bp.route("/api/admin/user/<int:user_id>", methods=['DELETE'])
 @jwt_required()
 def remove_family(user_id):
     current_user = User.query.filter_by(email=get_jwt_identity()).first()
@@ -408,43 +1006,694 @@ def remove_family(user_id):
     if user_to_delete.role == 'admin':
         return jsonify({"message": "Cannot remove admin accounts through this endpoint"}), 403
 
-    if user_to_delete.apartment:
-        user_to_delete.apartment.resident_id = None
+    apartment = user_to_delete.apartment
+    if apartment:
+        apartment.resident_id = None
     db.session.delete(user_to_delete)
+    change = record_change('user', user_id, 'delete')
+    db.session.flush()
+    change_id = change.id
     db.session.commit()
+    if apartment:
+        vacancy_index.add(apartment, change_id)
+    disconnect_user_sockets(user_id)
     return jsonify({"status": "success", "message": "Family removed successfully"})
 
 
+# --- RETENTION / ARCHIVAL ---
+def _iso(value):
+    return value.isoformat() if value else None
+
+def _chat_message_record(m):
+    return {"id": m.id, "sender": m.sender, "sender_id": m.sender_id, "text": m.text, "timestamp": _iso(m.timestamp)}
+
+def _complaint_record(c):
+    return {
+        "id": c.id,
+        "user_id": c.user_id,
+        "submitted_by": c.submitted_by,
+        "subject": c.subject,
+        "description": c.description,
+        "status": c.status,
+        "created_at": _iso(c.created_at),
+        "resolved_at": _iso(c.resolved_at),
+        "floor": c.floor,
+        "unit_number": c.unit_number
+    }
+
+# table name -> (model, timestamp column, extra filter, serializer)
+# Complaints age from resolved_at: an old complaint resolved yesterday stays hot, and pending
+# ones stay in the hot table however old they are.
+RETENTION_TABLES = {
+    "chat_message": (ChatMessage, ChatMessage.timestamp, None, _chat_message_record),
+    "complaint": (Complaint, Complaint.resolved_at, Complaint.status == 'Resolved', _complaint_record),
+}
+
+def _partitioning_enabled():
+    return current_app.config['RETENTION_PARTITIONING'] and db.engine.dialect.name == 'postgresql'
+
+# With RETENTION_PARTITIONING=1 on PostgreSQL, the hot tables are range-partitioned by month of
+# their retention timestamp, and retention archives and then drops whole expired partitions
+# instead of deleting rows. chat_message keeps a primary key of (id, timestamp); complaint.resolved_at
+# is NULL until a complaint is resolved, which a primary key can't contain, so complaint only gets
+# an index on id and unresolved complaints live in its DEFAULT partition.
+PARTITION_PRIMARY_KEY = {"chat_message": True, "complaint": False}
+
+def _relkind(table_name):
+    """'r' for a plain table, 'p' for a partitioned one, None if it doesn't exist."""
+    return db.session.execute(
+        db.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": table_name}
+    ).scalar()
+
+def _is_partitioned(table_name):
+    return _partitioning_enabled() and _relkind(table_name) == 'p'
+
+def _next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+def _create_month_partitions(table_name, first_month, last_month):
+    month = first_month
+    while month <= last_month:
+        db.session.execute(db.text(
+            f'CREATE TABLE IF NOT EXISTS "{table_name}_y{month.year}m{month.month:02d}" '
+            f"PARTITION OF \"{table_name}\" FOR VALUES FROM ('{month}') TO ('{_next_month(month)}')"
+        ))
+        month = _next_month(month)
+
+def _partition_horizon(months_ahead):
+    this_month = datetime.datetime.utcnow().date().replace(day=1)
+    last_month = this_month
+    for _ in range(months_ahead):
+        last_month = _next_month(last_month)
+    return this_month, last_month
+
+def ensure_partitions(months_ahead=3):
+    """Creates this month's and the next `months_ahead` monthly partitions of every partitioned
+    hot table. Rows with no matching partition land in the DEFAULT partition, where retention
+    never drops them, so this runs with every retention pass."""
+    this_month, last_month = _partition_horizon(months_ahead)
+    for table_name in RETENTION_TABLES:
+        if _is_partitioned(table_name):
+            _create_month_partitions(table_name, this_month, last_month)
+    db.session.commit()
+
+def setup_partitioning(months_ahead=3):
+    """Converts chat_message and complaint into monthly range-partitioned tables. Runs after
+    db.create_all(): a table that is still plain (just created, or from before partitioning was
+    enabled) is renamed, recreated partitioned with the same columns, refilled and dropped, in one
+    transaction per table. On a large table that holds an exclusive lock for the whole copy.
+    Tables that are already partitioned are left alone."""
+    if not _partitioning_enabled():
+        return
+    this_month, last_month = _partition_horizon(months_ahead)
+    for table_name, (model, ts_column, _, _) in RETENTION_TABLES.items():
+        if _relkind(table_name) != 'r':
+            continue
+        key = ts_column.key
+        old = f"{table_name}_unpartitioned"
+        db.session.execute(db.text(f'ALTER TABLE "{table_name}" RENAME TO "{old}"'))
+        db.session.execute(db.text(f'ALTER INDEX IF EXISTS "{table_name}_pkey" RENAME TO "{old}_pkey"'))
+        db.session.execute(db.text(
+            f'CREATE TABLE "{table_name}" (LIKE "{old}" INCLUDING DEFAULTS) PARTITION BY RANGE ("{key}")'
+        ))
+        if PARTITION_PRIMARY_KEY[table_name]:
+            db.session.execute(db.text(f'UPDATE "{old}" SET "{key}" = now() AT TIME ZONE \'utc\' WHERE "{key}" IS NULL'))
+            db.session.execute(db.text(f'ALTER TABLE "{table_name}" ADD PRIMARY KEY (id, "{key}")'))
+        else:
+            db.session.execute(db.text(f'CREATE INDEX "ix_{table_name}_id" ON "{table_name}" (id)'))
+        for fk in model.__table__.foreign_keys:
+            db.session.execute(db.text(
+                f'ALTER TABLE "{table_name}" ADD FOREIGN KEY ("{fk.parent.name}") '
+                f'REFERENCES "{fk.column.table.name}" ("{fk.column.name}")'
+            ))
+
+        oldest = db.session.execute(db.text(f'SELECT min("{key}") FROM "{old}"')).scalar()
+        first_month = min(oldest.date().replace(day=1), this_month) if oldest else this_month
+        _create_month_partitions(table_name, first_month, last_month)
+        db.session.execute(db.text(f'CREATE TABLE "{table_name}_default" PARTITION OF "{table_name}" DEFAULT'))
+        db.session.execute(db.text(f'INSERT INTO "{table_name}" SELECT * FROM "{old}"'))
+
+        # The id sequence belongs to the old table; hand it over before dropping that table.
+        sequence = db.session.execute(db.text("SELECT pg_get_serial_sequence(:name, 'id')"), {"name": old}).scalar()
+        if sequence:
+            db.session.execute(db.text(f'ALTER SEQUENCE {sequence} OWNED BY "{table_name}".id'))
+        db.session.execute(db.text(f'DROP TABLE "{old}"'))
+        db.session.commit()
+    ensure_partitions(months_ahead)
+
+def _expired_partitions(table_name, cutoff):
+    """(name, attached) for monthly partitions of `table_name` that end on or before `cutoff`,
+    including ones a previous run detached but didn't finish archiving."""
+    rows = db.session.execute(db.text(
+        "SELECT c.relname, i.inhparent IS NOT NULL FROM pg_class c"
+        " LEFT JOIN pg_inherits i ON i.inhrelid = c.oid"
+        " WHERE c.relkind = 'r' AND c.relnamespace = current_schema()::regnamespace AND c.relname LIKE :prefix"
+    ), {"prefix": f"{table_name}_y%"}).all()
+    expired = []
+    for name, attached in rows:
+        match = re.fullmatch(re.escape(table_name) + r'_y(\d{4})m(\d{2})', name)
+        if match and _next_month(datetime.date(int(match[1]), int(match[2]), 1)) <= cutoff.date():
+            expired.append((name, attached))
+    return sorted(expired)
+
+def _write_archive_file(table_name, first_id, last_id, payload):
+    archive_dir = current_app.config['RETENTION_ARCHIVE_DIR']
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{table_name}-{first_id:010d}-{last_id:010d}.ndjson.gz")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return os.path.abspath(path)  # stored in ArchiveBatch.file_path, read back from any cwd
+
+def archive_table(table_name, cutoff, batch_size, mode='table', partition=None):
+    """Moves rows of `table_name` older than `cutoff` into ArchiveBatch, one transaction per batch.
+    With `partition` (a detached monthly partition of `table_name`), moves all of its rows instead.
+    Returns the number of rows archived."""
+    model, ts_column, extra_filter, serialize = RETENTION_TABLES[table_name]
+    if partition is None:
+        table = model.__table__
+        query = db.select(table).where(ts_column < cutoff)
+        if extra_filter is not None:
+            query = query.where(extra_filter)
+    else:
+        table = model.__table__.to_metadata(db.MetaData(), name=partition)
+        query = db.select(table)
+
+    total = 0
+    while True:
+        # SKIP LOCKED (PostgreSQL) keeps a concurrent run off rows this one is moving; on other
+        # databases the DELETE ... RETURNING below is what decides which rows this run archives.
+        rows = db.session.execute(
+            query.order_by(table.c.id.asc()).limit(batch_size).with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            break
+        deleted = set(db.session.execute(
+            db.delete(table).where(table.c.id.in_([r.id for r in rows])).returning(table.c.id)
+        ).scalars())
+        rows = [r for r in rows if r.id in deleted]
+        if not rows:
+            db.session.commit()
+            continue
+        ids = [r.id for r in rows]
+        timestamps = [getattr(r, ts_column.key) for r in rows]
+        payload = gzip.compress(
+            "\n".join(json.dumps(serialize(r), separators=(",", ":")) for r in rows).encode("utf-8")
+        )
+
+        batch = ArchiveBatch(
+            table_name=table_name,
+            first_id=ids[0],
+            last_id=ids[-1],
+            min_ts=min(timestamps),
+            max_ts=max(timestamps),
+            row_count=len(rows)
+        )
+        if mode == 'file':
+            batch.file_path = _write_archive_file(table_name, ids[0], ids[-1], payload)
+        else:
+            batch.payload = payload
+        db.session.add(batch)
+        if table_name in SYNC_ENTITIES:
+            lock_change_log()
+            db.session.add_all([
+                ChangeLog(entity=table_name, entity_id=r.id, op='delete', audience_user_id=getattr(r, 'user_id', None))
+                for r in rows
+            ])
+        db.session.commit()
+        total += len(rows)
+    return total
+
+def archive_partitions(table_name, cutoff, batch_size, mode='table'):
+    """archive_table for a partitioned hot table: each monthly partition that ends before `cutoff`
+    is detached (a brief lock on the parent), archived batch by batch and dropped. Rows newer than
+    the last whole expired month wait for their partition to expire. Batches delete their rows
+    from the detached table as they go, so an interrupted run resumes where it stopped.
+    Returns the number of rows archived."""
+    total = 0
+    for partition, attached in _expired_partitions(table_name, cutoff):
+        if attached:
+            db.session.execute(db.text(f'ALTER TABLE "{table_name}" DETACH PARTITION "{partition}"'))
+            db.session.commit()
+        total += archive_table(table_name, cutoff, batch_size, mode, partition=partition)
+        db.session.execute(db.text(f'DROP TABLE "{partition}"'))
+        db.session.commit()
+    return total
+
+@contextlib.contextmanager
+def retention_lock():
+    """Yields True if this process may run retention. On PostgreSQL that means holding a
+    session-level advisory lock on a dedicated connection, so of all the gunicorn workers
+    (each with its own scheduled job) only one archives at a time; the others skip the run."""
+    if db.engine.dialect.name != 'postgresql':
+        yield True
+        return
+    with db.engine.connect() as conn:
+        acquired = conn.execute(db.text("SELECT pg_try_advisory_lock(7291002)")).scalar()
+        conn.commit()  # the lock outlives the transaction; don't sit idle in one while archiving
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(db.text("SELECT pg_advisory_unlock(7291002)"))
+                conn.commit()
+
+def run_retention(days=None, batch_size=None, mode=None):
+    """Archives every table in RETENTION_TABLES. Returns {table_name: rows archived}, or None
+    if another process is already running retention."""
+    days = days if days is not None else current_app.config['RETENTION_DAYS']
+    batch_size = batch_size or current_app.config['RETENTION_BATCH_SIZE']
+    mode = mode or current_app.config['RETENTION_MODE']
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    with retention_lock() as acquired:
+        if not acquired:
+            return None
+        ensure_partitions()
+        return {
+            name: (archive_partitions if _is_partitioned(name) else archive_table)(name, cutoff, batch_size, mode)
+            for name in RETENTION_TABLES
+        }
+
+def load_archive_batch(batch):
+    """Decompresses an ArchiveBatch back into a list of row dicts."""
+    if batch.payload is not None:
+        raw = batch.payload
+    else:
+        with open(batch.file_path, "rb") as f:
+            raw = f.read()
+    return [json.loads(line) for line in gzip.decompress(raw).decode("utf-8").splitlines() if line]
+
+def search_archive(table_name, record_id=None, start=None, end=None):
+    """Slow lookup path for archived rows: narrows candidate batches by id/time range, then
+    decompresses and filters them."""
+    ts_key = RETENTION_TABLES[table_name][1].key
+    query = ArchiveBatch.query.filter_by(table_name=table_name)
+    if record_id is not None:
+        query = query.filter(ArchiveBatch.first_id <= record_id, ArchiveBatch.last_id >= record_id)
+    if start is not None:
+        query = query.filter(ArchiveBatch.max_ts >= start)
+    if end is not None:
+        query = query.filter(ArchiveBatch.min_ts < end)
+
+    results = []
+    for batch in query.order_by(ArchiveBatch.first_id.asc()).all():
+        for record in load_archive_batch(batch):
+            if record_id is not None and record["id"] != record_id:
+                continue
+            ts = datetime.datetime.fromisoformat(record[ts_key]) if record[ts_key] else None
+            if start is not None and (ts is None or ts < start):
+                continue
+            if end is not None and (ts is None or ts >= end):
+                continue
+            results.append(record)
+    return results
+
+@bp.route("/api/admin/archive/<table_name>", methods=['GET'])
+@jwt_required()
+def get_archived_records(table_name):
+    current_user = User.query.filter_by(email=get_jwt_identity()).first()
+    if current_user.role != 'admin':
+        return jsonify({"message": "Unauthorized"}), 403
+    if table_name not in RETENTION_TABLES:
+        return jsonify({"message": f"Unknown archive: {table_name}"}), 404
+
+    try:
+        record_id = request.args.get('id', type=int)
+        start = request.args.get('from')
+        end = request.args.get('to')
+        start = datetime.datetime.fromisoformat(start) if start else None
+        end = datetime.datetime.fromisoformat(end) if end else None
+    except ValueError:
+        return jsonify({"message": "from and to must be ISO dates (YYYY-MM-DD)"}), 400
+    if record_id is None and start is None and end is None:
+        return jsonify({"message": "Provide id, from or to"}), 400
+
+    return jsonify(search_archive(table_name, record_id=record_id, start=start, end=end))
+
+
+@bp.cli.group()
+def retention():
+    """Archive old ChatMessage and Complaint rows and compact the sync change log."""
+
+@retention.command('run')
+@click.option('--days', type=int, default=None, help='Archive rows older than this many days.')
+@click.option('--batch-size', type=int, default=None, help='Rows moved per transaction.')
+@click.option('--mode', type=click.Choice(['table', 'file']), default=None, help='Where archived rows are stored.')
+def retention_run(days, batch_size, mode):
+    counts = run_retention(days, batch_size, mode)
+    if counts is None:
+        click.echo("Retention is already running in another process")
+        return
+    for table_name, count in counts.items():
+        click.echo(f"{table_name}: archived {count} rows")
+
+@retention.command('partitions')
+@click.option('--months-ahead', type=int, default=3)
+def retention_partitions(months_ahead):
+    if not _partitioning_enabled():
+        click.echo("Partitioning is disabled (set RETENTION_PARTITIONING=1 on PostgreSQL).")
+        return
+    setup_partitioning(months_ahead)
+    click.echo(f"{', '.join(RETENTION_TABLES)} partitioned by month")
+
+@retention.command('compact-changelog')
+@click.option('--days', type=int, default=None, help='Delete change-log entries older than this many days.')
+def retention_compact_changelog(days):
+    removed = compact_change_log(days)
+    if removed is None:
+        click.echo("Retention is already running in another process")
+        return
+    click.echo(f"change_log: removed {removed} entries, low-water cursor {change_log_low_water()}")
+
+
+_retention_job_started = False
+
+def _retention_job(app):
+    interval = app.config['RETENTION_INTERVAL_HOURS'] * 3600
+    while True:
+        socketio.sleep(interval)
+        with app.app_context():
+            try:
+                counts = run_retention()
+                if counts is not None:
+                    print(f"Retention job archived: {counts}")
+                removed = compact_change_log()
+                if removed:
+                    print(f"Retention job compacted {removed} change-log entries")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Retention job failed: {e}")
+
+@bp.before_app_request
+def start_retention_job():
+    # Started from the first request rather than at import time so `flask retention ...`
+    # and other CLI invocations don't spawn the background loop.
+    global _retention_job_started
+    if _retention_job_started or not current_app.config['RETENTION_INTERVAL_HOURS']:
+        return
+    _retention_job_started = True
+    socketio.start_background_task(_retention_job, current_app._get_current_object())
+
+
 # --- SOCKET EVENTS ---
+# Verified identity per socket, keyed by request.sid. Filled once at connect from the JWT,
+# so socket events never touch the database to find out who is talking.
+socket_sessions = {}
+
+def _socket_token(auth):
+    if isinstance(auth, dict) and auth.get('token'):
+        return auth['token']
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):]
+    return request.args.get('token')
+
+def current_socket_identity():
+    """Returns the cached identity for this socket, evicting and disconnecting it once the
+    token has expired."""
+    identity = socket_sessions.get(request.sid)
+    if identity and identity["exp"] is not None and identity["exp"] <= time.time():
+        socket_sessions.pop(request.sid, None)
+        identity = None
+    if identity is None:
+        disconnect()
+    return identity
+
+# Called with a user id after that account is removed; asgi.py registers one for its own sockets
+user_removed_hooks = []
+
+def disconnect_user_sockets(user_id):
+    """Disconnects this process's sockets authenticated as `user_id`."""
+    for sid, identity in list(socket_sessions.items()):
+        if identity["user_id"] == user_id:
+            socket_sessions.pop(sid, None)
+            socketio.server.disconnect(sid, namespace='/')
+    for hook in user_removed_hooks:
+        hook(user_id)
+
+_socket_sweep_started = False
+
+def _sweep_expired_sockets(interval):
+    # Idle sockets never reach current_socket_identity(), so expiry is also enforced here
+    while True:
+        socketio.sleep(interval)
+        now = time.time()
+        for sid, identity in list(socket_sessions.items()):
+            if identity["exp"] is not None and identity["exp"] <= now:
+                socket_sessions.pop(sid, None)
+                socketio.server.disconnect(sid, namespace='/')
+
 @socketio.on('connect')
-def handle_connect():
-    print('Client connected')
+def handle_connect(auth=None):
+    token = _socket_token(auth)
+    if not token:
+        raise ConnectionRefusedError('Authentication required')
+    try:
+        claims = decode_token(token)
+    except Exception:
+        raise ConnectionRefusedError('Invalid or expired token')
+
+    user = User.query.filter_by(email=claims['sub']).first()
+    if not user:
+        raise ConnectionRefusedError('Unknown user')
+    socket_sessions[request.sid] = {
+        "user_id": user.id,
+        "name": user.full_name,
+        "role": user.role,
+        "flat": user.apartment.unit_number if user.apartment else None,
+        "exp": claims.get('exp')
+    }
+    print(f'Client connected: {user.email}')
+
+    global _socket_sweep_started
+    if not _socket_sweep_started:
+        _socket_sweep_started = True
+        socketio.start_background_task(_sweep_expired_sockets, current_app.config['SOCKET_SWEEP_SECONDS'])
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    socket_sessions.pop(request.sid, None)
 
 @socketio.on('send_message')
 def handle_message(data):
-    # FIX #9: validate that sender info is present; sender_id is set by the client
-    # and stored for proper sent/received differentiation
-    sender_name = data.get('sender', 'Unknown')
-    sender_id = data.get('sender_id')  # FIX #9: client must pass sender_id from JWT login response
-    text = data.get('text', '').strip()
+    # Sender comes from the verified socket session; any client-supplied sender/sender_id is ignored
+    identity = current_socket_identity()
+    if identity is None:
+        return
+    text = ((data or {}).get('text') or '').strip()
 
     if not text:
         return  # Ignore empty messages
 
-    msg = ChatMessage(sender=sender_name, sender_id=sender_id, text=text)
+    msg = ChatMessage(sender=identity["name"], sender_id=identity["user_id"], text=text)
     db.session.add(msg)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # sender_id no longer exists: the account was removed, possibly by another worker
+        db.session.rollback()
+        socket_sessions.pop(request.sid, None)
+        disconnect()
+        return
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
     emit('receive_message', {
         "id": msg.id,
-        "sender": sender_name,
-        "sender_id": sender_id,
+        "sender": identity["name"],
+        "sender_id": identity["user_id"],
+        "flat": identity["flat"],
         "text": text
     }, broadcast=True)
 
 
+# --- SAMPLING PROFILER ---
+# The sampler must be a real OS thread sleeping with the real time.sleep: under eventlet a green
+# thread would never run while a request is busy on the CPU.
+if SERVER_MODE == 'eventlet':
+    import greenlet
+    _os_threading = eventlet.patcher.original('threading')
+    _os_sleep = eventlet.patcher.original('time').sleep
+else:
+    greenlet = None
+    _os_threading, _os_sleep = threading, time.sleep
+
+class StackSampler:
+    """Samples the stacks of registered requests every `interval` seconds and aggregates them
+    into flamegraph collapsed format ("root;child;leaf count").
+
+    Overhead is bounded by the caller: at most `max_concurrent` requests are registered at once,
+    the thread sleeps while none are, and at most `max_stacks` distinct stacks are kept.
+    Under eventlet every request is a greenlet on the same OS thread, so a request is sampled
+    through its greenlet: the OS thread's frame while it is the one running, otherwise its
+    suspended frame (gr_frame), which shows where it is waiting."""
+
+    MAX_DEPTH = 64
+
+    def __init__(self, interval, max_concurrent, max_stacks):
+        self.interval = interval
+        self.max_concurrent = max_concurrent
+        self.max_stacks = max_stacks
+        self._lock = _os_threading.Lock()
+        self._active = {}  # key -> (OS thread id, greenlet or None, endpoint label)
+        self._keys = itertools.count()
+        self._wake = _os_threading.Event()
+        self._thread = None
+        self.stacks = {}
+        self.dropped = 0
+
+    def start(self, label):
+        """Registers the calling request for sampling. Returns the key to pass to stop(), or None
+        if the concurrency cap is reached."""
+        target = (_os_threading.get_ident(), greenlet.getcurrent() if greenlet else None, label)
+        with self._lock:
+            if len(self._active) >= self.max_concurrent:
+                return None
+            key = next(self._keys)
+            self._active[key] = target
+            if self._thread is None:
+                self._thread = _os_threading.Thread(target=self._run, name='bms-stack-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return key
+
+    def stop(self, key):
+        with self._lock:
+            self._active.pop(key, None)
+            if not self._active:
+                self._wake.clear()
+
+    def _collapse(self, frame, label):
+        names = []
+        while frame is not None and len(names) < self.MAX_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+            frame = frame.f_back
+        names.append(label)
+        return ";".join(reversed(names))
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            _os_sleep(self.interval)
+            with self._lock:
+                active = list(self._active.values())
+            frames = sys._current_frames()
+            for thread_id, gr, label in active:
+                if gr is not None and gr.dead:
+                    continue
+                # gr_frame is None only while the greenlet is the one running on its thread
+                frame = gr.gr_frame if gr is not None else None
+                if frame is None:
+                    frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = self._collapse(frame, label)
+                with self._lock:
+                    if stack in self.stacks:
+                        self.stacks[stack] += 1
+                    elif len(self.stacks) < self.max_stacks:
+                        self.stacks[stack] = 1
+                    else:
+                        self.dropped += 1
+            del frames
+
+    def collapsed(self, label=None):
+        with self._lock:
+            items = sorted(self.stacks.items())
+        prefix = f"{label};" if label else None
+        return "".join(f"{stack} {count}\n" for stack, count in items if prefix is None or stack.startswith(prefix))
+
+    def reset(self):
+        with self._lock:
+            self.stacks = {}
+            self.dropped = 0
+
+_sampler = None
+_request_counter = itertools.count()
+
+def get_sampler():
+    global _sampler
+    if _sampler is None:
+        config = current_app.config
+        _sampler = StackSampler(config['PROFILER_INTERVAL_MS'] / 1000, config['PROFILER_MAX_CONCURRENT'],
+                                config['PROFILER_MAX_STACKS'])
+    return _sampler
+
+@bp.before_app_request
+def start_request_sampling():
+    config = current_app.config
+    token = config['PROFILER_HEADER_TOKEN']
+    forced = token is not None and request.headers.get('X-BMS-Profile') == token
+    rate = config['PROFILER_SAMPLE_RATE']
+    if not forced and not (rate and next(_request_counter) % rate == 0):
+        return
+    key = get_sampler().start(request.endpoint or request.path)
+    if key is not None:
+        request.environ['bms.profile_key'] = key
+
+@bp.teardown_app_request
+def stop_request_sampling(exc):
+    key = request.environ.pop('bms.profile_key', None)
+    if key is not None:
+        get_sampler().stop(key)
+
+@bp.route("/api/admin/profile", methods=['GET'])
+@jwt_required()
+def get_profile():
+    current_user = User.query.filter_by(email=get_jwt_identity()).first()
+    if current_user.role != 'admin':
+        return jsonify({"message": "Unauthorized"}), 403
+    sampler = get_sampler()
+    # Endpoint names are the root frame, e.g. ?endpoint=bms.login or ?endpoint=bms.get_all_residents
+    output = sampler.collapsed(request.args.get('endpoint'))
+    if request.args.get('reset') == '1':
+        sampler.reset()
+    return current_app.response_class(output, mimetype='text/plain')
+
+
+# --- LEGACY IMPORT ---
+@bp.cli.command('import-legacy')
+@click.option('--data', 'data_path', default='data.json', help='bms.py data file to import.')
+@click.option('--config', 'config_path', default='config.json', help='bms.py config file (admin and flats).')
+@click.option('--batch-size', type=int, default=1000, help='Records per transaction.')
+def import_legacy_command(data_path, config_path, batch_size):
+    """Import families and notices from the CLI's JSON files into the database."""
+    started = time.perf_counter()
+    counts = import_legacy_json(SQLAlchemyStorage(current_app._get_current_object()), data_path, config_path, batch_size)
+    click.echo(f"Imported {counts['families']} families and {counts['notices']} notices "
+               f"in {time.perf_counter() - started:.2f}s")
+
+
+# --- SCHEMA HELPERS ---
+def add_missing_columns():
+    """db.create_all() only creates missing tables; this adds nullable columns that were added
+    to existing models since the table was created."""
+    inspector = db.inspect(db.engine)
+    existing_tables = inspector.get_table_names()
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(db.text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+    db.session.commit()
+
+def add_missing_indexes():
+    """Creates model indexes (index=True / __table_args__) that existing tables don't have yet;
+    db.create_all() only creates them together with a new table."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
 # --- ONE-TIME SETUP ROUTE FOR POSTGRESQL MIGRATION ---
 # FIX #6: Protected with a secret key via environment variable — remove after first run
-@app.route('/database-setup-migrate', methods=['GET'])
+@bp.route('/database-setup-migrate', methods=['GET'])
 def database_setup_migrate():
     setup_key = request.args.get('key')
     expected_key = os.environ.get('SETUP_SECRET_KEY')
@@ -453,8 +1702,15 @@ def database_setup_migrate():
     if not expected_key or setup_key != expected_key:
         return jsonify({"status": "error", "message": "Unauthorized"}), 403
 
-    with app.app_context():
+    with current_app.app_context():
         db.create_all()
+        add_missing_columns()
+        add_missing_indexes()
+        setup_partitioning()
+        if not ComplaintDailyStat.query.first():
+            # Complaints from before the rollup existed; without this their first status change
+            # would subtract from an empty rollup and show negative counts
+            rebuild_complaint_stats()
 
         if not Apartment.query.first():
             print("Creating Building Flats...")
@@ -465,6 +1721,7 @@ def database_setup_migrate():
                     unit_num = f"{f}{u}"
                     db.session.add(Apartment(unit_number=unit_num, floor=f))
             db.session.commit()
+            vacancy_index.invalidate()
 
         admin = User.query.filter_by(email="admin@bms.com").first()
         if not admin:
@@ -478,6 +1735,74 @@ def database_setup_migrate():
     return jsonify({"status": "success", "message": "PostgreSQL Setup Complete! Tables and Admin created."})
 
 
+# --- APP FACTORY ---
+def create_app():
+    with startup_step('flask app + config'):
+        app = Flask(__name__)
+        configure(app)
+    if orjson is not None:
+        app.json = FastJSONProvider(app)
+    with startup_step('init cors'):
+        # --- 1. CORS CONFIGURATION ---
+        cors.init_app(app, resources={r"/*": {"origins": "*"}})
+    with startup_step('init jwt'):
+        jwt.init_app(app)
+    with startup_step('init sqlalchemy'):
+        db.init_app(app)
+    with startup_step('init socketio'):
+        # In ASGI mode socket events are served by asgi.py; threading keeps background tasks working here
+        socketio.init_app(app, cors_allowed_origins="*",
+                          async_mode='eventlet' if SERVER_MODE == 'eventlet' else 'threading')
+    with startup_step('register routes'):
+        app.register_blueprint(bp)
+    with startup_step('build vacancy index'), app.app_context():
+        try:
+            vacancy_index.rebuild()
+        except SQLAlchemyError:  # tables not created yet; built on first use instead
+            db.session.rollback()
+
+    boot_ms = (time.perf_counter() - _module_started) * 1000
+    app.config['STARTUP_MS'] = boot_ms
+    print(f"Worker {os.getpid()} booted in {boot_ms:.0f} ms")
+    if boot_ms > app.config['STARTUP_BUDGET_MS']:
+        print(f"WARNING: boot took {boot_ms:.0f} ms, over the {app.config['STARTUP_BUDGET_MS']:.0f} ms budget")
+    if os.environ.get('BMS_PROFILE_STARTUP') == '1':
+        print_startup_profile()
+    return app
+
+def print_startup_profile():
+    total = time.perf_counter() - _module_started
+    print(f"{'component':<28}{'ms':>10}")
+    for component, seconds in STARTUP_TIMINGS:
+        print(f"{component:<28}{seconds * 1000:>10.1f}")
+    accounted = sum(seconds for _, seconds in STARTUP_TIMINGS)
+    print(f"{'other (module body)':<28}{(total - accounted) * 1000:>10.1f}")
+    print(f"{'total':<28}{total * 1000:>10.1f}")
+
+_app = None
+
+def get_app():
+    global _app
+    if _app is None:
+        _app = create_app()
+    return _app
+
+def __getattr__(name):
+    # `gunicorn app:app`, `flask --app app ...` and `from app import app` keep working; the
+    # app and its extensions are only built on first access.
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # --- APP RUNNER ---
 if __name__ == '__main__':
-    socketio.run(app, port=5000, debug=True)
\ No newline at end of file
+    if '--profile-startup' in sys.argv:
+        app = create_app()
+        print_startup_profile()
+        sys.exit(1 if app.config['STARTUP_MS'] > app.config['STARTUP_BUDGET_MS'] else 0)
+    if SERVER_MODE == 'asgi':
+        import uvicorn
+        uvicorn.run('asgi:application', port=5000)
+    else:
+        socketio.run(get_app(), port=5000, debug=True)
\ No newline at end of file
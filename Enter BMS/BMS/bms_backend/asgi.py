@@ -0,0 +1,166 @@
+"""ASGI entry point: the same HTTP routes and socket events on asyncio instead of eventlet.
+
+    BMS_SERVER_MODE=asgi uvicorn asgi:application --port 5000
+
+HTTP routes are the Flask app from app.py, run by a2wsgi on a pool of ASGI_WSGI_WORKERS
+threads (no monkey patching, so a slow psycopg2 query blocks only its own thread). Socket.IO events run natively on the
+event loop and talk to the database through an async driver (asyncpg / aiosqlite).
+"""
+import os
+
+os.environ.setdefault('BMS_SERVER_MODE', 'asgi')
+
+import asyncio  # noqa: E402
+import time  # noqa: E402
+
+import socketio  # noqa: E402
+from socketio.exceptions import ConnectionRefusedError  # noqa: E402
+from a2wsgi import WSGIMiddleware  # noqa: E402
+from flask_jwt_extended import decode_token  # noqa: E402
+from sqlalchemy import insert, select  # noqa: E402
+from sqlalchemy.exc import IntegrityError  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from app import app, db, user_removed_hooks, Apartment, ChatMessage, User, SERVER_MODE  # noqa: E402
+
+if SERVER_MODE != 'asgi':
+    raise RuntimeError("asgi.py needs BMS_SERVER_MODE=asgi (app.py was already imported in eventlet mode)")
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_database_url():
+    """The app's database URL with its driver swapped for the async equivalent."""
+    with app.app_context():
+        url = db.engine.url
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+ASYNC_DATABASE_URL = async_database_url()
+engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **({} if ASYNC_DATABASE_URL.get_backend_name() == 'sqlite' else {"pool_size": int(os.environ.get('ASGI_DB_POOL_SIZE', 10))})
+)
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+SOCKET_SWEEP_SECONDS = app.config['SOCKET_SWEEP_SECONDS']
+
+
+# --- SOCKET EVENTS ---
+# Same contract as the eventlet handlers in app.py: the JWT is verified once at connect and
+# the identity is kept in the socket session, so events never query the user table.
+socket_expiry = {}  # sid -> token exp, for the sweep below
+socket_users = {}  # sid -> user id, so removing an account can drop its sockets
+_sweep_started = False
+_loop = None
+
+
+def disconnect_removed_user(user_id):
+    # Called from remove_family on an a2wsgi worker thread; the sockets live on the event loop
+    for sid, uid in list(socket_users.items()):
+        if uid == user_id and _loop is not None:
+            asyncio.run_coroutine_threadsafe(sio.disconnect(sid), _loop)
+
+
+user_removed_hooks.append(disconnect_removed_user)
+
+def _socket_token(environ, auth):
+    if isinstance(auth, dict) and auth.get('token'):
+        return auth['token']
+    header = environ.get('HTTP_AUTHORIZATION', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):]
+    for part in environ.get('QUERY_STRING', '').split('&'):
+        if part.startswith('token='):
+            return part[len('token='):]
+    return None
+
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    token = _socket_token(environ, auth)
+    if not token:
+        raise ConnectionRefusedError('Authentication required')
+    try:
+        with app.app_context():
+            claims = decode_token(token)
+    except Exception:
+        raise ConnectionRefusedError('Invalid or expired token')
+
+    async with engine.connect() as conn:
+        row = (await conn.execute(
+            select(User.id, User.full_name, User.role, Apartment.unit_number)
+            .outerjoin(Apartment, Apartment.resident_id == User.id)
+            .where(User.email == claims['sub'])
+        )).first()
+    if row is None:
+        raise ConnectionRefusedError('Unknown user')
+    await sio.save_session(sid, {
+        "user_id": row.id,
+        "name": row.full_name,
+        "role": row.role,
+        "flat": row.unit_number,
+        "exp": claims.get('exp')
+    })
+    socket_expiry[sid] = claims.get('exp')
+    socket_users[sid] = row.id
+
+    global _sweep_started, _loop
+    _loop = asyncio.get_running_loop()
+    if not _sweep_started:
+        _sweep_started = True
+        sio.start_background_task(sweep_expired_sockets)
+
+
+async def sweep_expired_sockets():
+    # Idle sockets never reach send_message's exp check, so expiry is also enforced here
+    while True:
+        await sio.sleep(SOCKET_SWEEP_SECONDS)
+        now = time.time()
+        for sid, exp in list(socket_expiry.items()):
+            if exp is not None and exp <= now:
+                socket_expiry.pop(sid, None)
+                socket_users.pop(sid, None)
+                await sio.disconnect(sid)
+
+
+@sio.event
+async def disconnect(sid, *args):
+    socket_expiry.pop(sid, None)
+    socket_users.pop(sid, None)
+
+
+@sio.event
+async def send_message(sid, data):
+    identity = await sio.get_session(sid)
+    if identity["exp"] is not None and identity["exp"] <= time.time():
+        await sio.disconnect(sid)
+        return
+    text = ((data or {}).get('text') or '').strip()
+    if not text:
+        return  # Ignore empty messages
+
+    try:
+        async with engine.begin() as conn:  # rolls back if the insert fails
+            result = await conn.execute(
+                insert(ChatMessage.__table__).values(sender=identity["name"], sender_id=identity["user_id"], text=text)
+            )
+            message_id = result.inserted_primary_key[0]
+    except IntegrityError:
+        # sender_id no longer exists: the account was removed, possibly by another worker
+        await sio.disconnect(sid)
+        return
+    await sio.emit('receive_message', {
+        "id": message_id,
+        "sender": identity["name"],
+        "sender_id": identity["user_id"],
+        "flat": identity["flat"],
+        "text": text
+    })
+
+
+# Not asgiref's WsgiToAsgi: it runs every request on one shared thread (thread_sensitive=True),
+# which would serialize all HTTP traffic behind the slowest query.
+application = socketio.ASGIApp(
+    sio, other_asgi_app=WSGIMiddleware(app, workers=int(os.environ.get('ASGI_WSGI_WORKERS', 20)))
+)
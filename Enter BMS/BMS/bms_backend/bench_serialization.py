@@ -0,0 +1,66 @@
+"""Micro-benchmark: CPU time to build a 10k-row /api/notices response.
+
+Compares the original path (ORM objects, per-row strftime, stdlib json) with
+serialize_rows() + the app's JSON provider (orjson when installed).
+
+    python bench_serialization.py [rows] [repeats]
+"""
+import datetime
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app, db, Notice, NOTICE_SCHEMA, serialize_rows  # noqa: E402
+
+
+def seed(rows):
+    db.create_all()
+    start = datetime.datetime(2024, 1, 1)
+    db.session.bulk_insert_mappings(Notice, [
+        {"title": f"Notice {i}", "content": "Water supply will be off between 10am and 2pm." * 3,
+         "created_at": start + datetime.timedelta(hours=i)}
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def before():
+    notices = Notice.query.order_by(Notice.created_at.desc()).all()
+    output = [{"id": n.id, "title": n.title, "content": n.content, "date_posted": n.created_at.strftime("%Y-%m-%d")} for n in notices]
+    return json.dumps(output, sort_keys=True).encode('utf-8')
+
+
+def after():
+    output = serialize_rows(NOTICE_SCHEMA, Notice.query.order_by(Notice.created_at.desc()))
+    return app.json.response(output).get_data()
+
+
+def measure(fn, repeats):
+    best = None
+    for _ in range(repeats):
+        db.session.expunge_all()
+        started = time.process_time()
+        fn()
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with app.test_request_context():
+        seed(rows)
+        assert json.loads(before()) == json.loads(after())
+        old = measure(before, repeats)
+        new = measure(after, repeats)
+    print(f"JSON provider: {type(app.json).__name__}")
+    print(f"before: {old * 1000:.1f} ms CPU per {rows}-row response")
+    print(f"after:  {new * 1000:.1f} ms CPU per {rows}-row response ({old / new:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Side-by-side load test of the eventlet and ASGI serving modes.
+
+Start both servers, then point this at them:
+
+    gunicorn --worker-class eventlet -w 1 -b :5000 app:app
+    BMS_SERVER_MODE=asgi uvicorn asgi:application --port 5001
+    python bench_servers.py http://127.0.0.1:5000 http://127.0.0.1:5001
+
+For each concurrency level, N connections stay open and send keep-alive GETs for a fixed
+duration. The script reports throughput, p50/p99 latency and failed connections. The
+highest level with no failures and acceptable p99 is the connection capacity.
+"""
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+async def _client(host, port, path, deadline, latencies, errors):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        errors.append('connect')
+        return
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode()
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in headers.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            if not headers.startswith(b"HTTP/1.1 2"):
+                errors.append(headers.split(b"\r\n", 1)[0].decode())
+            latencies.append(time.perf_counter() - started)
+    except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        errors.append('disconnect')
+    finally:
+        writer.close()
+
+
+def _percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run_level(url, path, concurrency, duration):
+    parts = urlsplit(url)
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        _client(parts.hostname, parts.port or 80, path, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    return {
+        "rps": len(latencies) / duration,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "errors": len(errors),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('eventlet_url')
+    parser.add_argument('asgi_url')
+    parser.add_argument('--path', default='/api/notices')
+    parser.add_argument('--levels', default='10,50,100,250,500,1000')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per level.')
+    args = parser.parse_args()
+
+    print(f"{'mode':<9}{'conns':>7}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for level in (int(n) for n in args.levels.split(',')):
+        for mode, url in (('eventlet', args.eventlet_url), ('asgi', args.asgi_url)):
+            r = await run_level(url, args.path, level, args.duration)
+            print(f"{mode:<9}{level:>7}{r['rps']:>10.0f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
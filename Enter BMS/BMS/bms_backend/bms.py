@@ -1,8 +1,9 @@
 from datetime import datetime
-import json
-import bcrypt
 import os
 
+from passwords import hash_password, is_password_hash, verify_password
+from storage import storage_from_env
+
 # --- Constants & Utility ---
 
 class Notice:
@@ -26,16 +27,16 @@ class Family:
         self.members = members
         self.email = email
         
-        # Hashing password if not already a hash
-        if password and not password.startswith("$2b$"):
-            self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        # Hashing password if not already a hash (bcrypt from older data.json, or Werkzeug)
+        if password and not is_password_hash(password):
+            self.password_hash = hash_password(password)
         else:
             self.password_hash = password
         self.nid = nid
 
     def check_password(self, password):
         """Checks if the given password matches the stored hash."""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return verify_password(self.password_hash, password)
 
     def to_dict(self):
         """Prepares the object for JSON serialization."""
@@ -54,7 +55,9 @@ class Family:
 # -----------------------------
 
 class BuildingSystem:
-    def __init__(self):
+    def __init__(self, storage=None):
+        # JSON files by default; see storage.storage_from_env for the SQLite/SQLAlchemy backends
+        self.storage = storage or storage_from_env()
         self.families = []
         self.notices = []
         self.admin_email = None
@@ -69,27 +72,25 @@ class BuildingSystem:
         self.load_data()
 
     def _load_config(self):
-        """Loads or attempts to load the config.json file."""
-        try:
-            with open("config.json", "r") as f:
-                config = json.load(f)
-                self.admin_email = config["admin_email"]
-                self.admin_password_hash = config["admin_password_hash"].encode('utf-8')
-                self.total_flats = set(config["total_flats"])
-            return True # Config loaded successfully
-        except (FileNotFoundError, KeyError):
+        """Loads or attempts to load the building config from storage."""
+        config = self.storage.load_config()
+        if config is None:
             # Config not found or corrupted, needs interactive setup
             return False
+        self.admin_email = config["admin_email"]
+        self.admin_password_hash = config["admin_password_hash"]
+        self.total_flats = set(config["total_flats"])
+        return True # Config loaded successfully
     
     def setup_initial_config(self, num_floors, units_per_floor):
         """
         Creates and saves the initial config based on interactive input.
-        This runs only once when config.json is missing.
+        This runs only once when no config is stored yet.
         """
         self.admin_email = os.getenv("BMS_ADMIN_EMAIL", "admin@bms.com")
         admin_password = os.getenv("BMS_ADMIN_PASSWORD", "supersecure")
 
-        self.admin_password_hash = bcrypt.hashpw(admin_password.encode('utf-8'), bcrypt.gensalt())
+        self.admin_password_hash = hash_password(admin_password)
         
         # Generate flats based on user input (e.g., 1A, 1B, 2A, 2B, etc.)
         flats_list = [
@@ -101,11 +102,10 @@ class BuildingSystem:
 
         config = {
             "admin_email": self.admin_email,
-            "admin_password_hash": self.admin_password_hash.decode('utf-8'),
+            "admin_password_hash": self.admin_password_hash,
             "total_flats": sorted(flats_list)
         }
-        with open("config.json", "w") as f:
-            json.dump(config, f, indent=4)
+        self.storage.save_config(config)
             
         self.config_loaded = True
         print(f"\n--- Initial Building Setup Complete ---")
@@ -114,39 +114,28 @@ class BuildingSystem:
         print("---------------------------------------")
 
 
-    def save_data(self):
-        """Saves family and notice data to data.json."""
-        families_data = [f.to_dict() for f in self.families]
-        notices_data = [vars(n) for n in self.notices]
-        data = {"families": families_data, "notices": notices_data}
-        with open("data.json", "w") as f:
-            json.dump(data, f, indent=4)
-
     def load_data(self):
-        """Loads family and notice data from data.json."""
+        """Loads family and notice data from storage."""
         try:
-            with open("data.json", "r") as f:
-                data = json.load(f)
-                
-                self.families = []
-                for f_data in data.get("families", []):
-                    family_obj = Family(
-                        flat_no=f_data["flat_no"],
-                        head_member=f_data["head_member"],
-                        phone=f_data["phone"],
-                        members=f_data["members"],
-                        email=f_data["email"],
-                        # Use password_hash directly for loading
-                        password=f_data.get("password_hash"), 
-                        nid=f_data["nid"]
-                    )
-                    # Ensure we restore the hash correctly
-                    family_obj.password_hash = f_data.get("password_hash")
-                    self.families.append(family_obj)
-
-                self.notices = [Notice(**n) for n in data.get("notices", [])]
-        except FileNotFoundError:
-            self.families, self.notices = [], []
+            families_data, notices_data = self.storage.load_data()
+
+            self.families = []
+            for f_data in families_data:
+                family_obj = Family(
+                    flat_no=f_data["flat_no"],
+                    head_member=f_data["head_member"],
+                    phone=f_data["phone"],
+                    members=f_data["members"],
+                    email=f_data["email"],
+                    # Use password_hash directly for loading
+                    password=f_data.get("password_hash"),
+                    nid=f_data["nid"]
+                )
+                # Ensure we restore the hash correctly
+                family_obj.password_hash = f_data.get("password_hash")
+                self.families.append(family_obj)
+
+            self.notices = [Notice(**n) for n in notices_data]
         except Exception as e:
             print(f"Error loading data: {e}")
             self.families, self.notices = [], []
@@ -159,7 +148,7 @@ class BuildingSystem:
              
         if email != self.admin_email:
             return False
-        if bcrypt.checkpw(password.encode('utf-8'), self.admin_password_hash):
+        if verify_password(self.admin_password_hash, password):
             return "admin"
         return False
 
@@ -183,8 +172,12 @@ class BuildingSystem:
             return
 
         new_family = Family(flat_no, head_member, phone, members, email, password, nid)
+        # Storage is the real occupancy check: with a shared database the web app may have
+        # assigned the flat (or the email) since self.families was loaded.
+        if not self.storage.add_family(new_family.to_dict()):
+            print(f"\nFlat {flat_no} is already occupied or {email} is already registered.")
+            return
         self.families.append(new_family)
-        self.save_data()
         print(f"\nFamily added to flat **{flat_no}**. Head: {head_member}.")
 
 
@@ -216,8 +209,9 @@ class BuildingSystem:
 
     def post_notice(self, title, content):
         """Posts a new building notice."""
-        self.notices.append(Notice(title, content))
-        self.save_data()
+        notice = Notice(title, content)
+        self.storage.add_notice(vars(notice))
+        self.notices.append(notice)
         print(f"\n📢 Notice posted: **{title}**")
     
     def view_notices(self):
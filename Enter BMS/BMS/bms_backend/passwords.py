@@ -0,0 +1,37 @@
+"""Password hashing shared by the CLI (bms.py) and the web app (app.py).
+
+bms.py historically stored bcrypt hashes ("$2b$..."), app.py stores Werkzeug hashes
+("pbkdf2:..." / "scrypt:..."). Both are accepted everywhere; new hashes are Werkzeug.
+"""
+import bcrypt
+from werkzeug.security import check_password_hash, generate_password_hash
+
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+WERKZEUG_PREFIXES = ("pbkdf2:", "scrypt:")
+
+
+def is_bcrypt_hash(value):
+    return bool(value) and value.startswith(BCRYPT_PREFIXES)
+
+
+def is_password_hash(value):
+    """True if `value` already looks like a stored hash rather than a plaintext password."""
+    return bool(value) and (value.startswith(BCRYPT_PREFIXES) or value.startswith(WERKZEUG_PREFIXES))
+
+
+def hash_password(password):
+    return generate_password_hash(password)
+
+
+def verify_password(stored_hash, password):
+    """Checks `password` against a bcrypt or Werkzeug hash."""
+    if not stored_hash or password is None:
+        return False
+    if isinstance(stored_hash, bytes):
+        stored_hash = stored_hash.decode('utf-8')
+    if is_bcrypt_hash(stored_hash):
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
+        except ValueError:  # malformed hash
+            return False
+    return check_password_hash(stored_hash, password)
@@ -0,0 +1,449 @@
+"""Storage backends for BuildingSystem (bms.py), plus the legacy data.json importer.
+
+All backends exchange plain dicts shaped like the original JSON files:
+    config:  {"admin_email", "admin_password_hash", "total_flats"}
+    family:  {"flat_no", "head_member", "phone", "members", "email", "password_hash", "nid"}
+    notice:  {"title", "content", "date_posted"}   (date_posted is "YYYY-MM-DD HH:MM")
+"""
+import contextlib
+import datetime
+import json
+import os
+import re
+import sqlite3
+
+NOTICE_DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+
+class StorageBackend:
+    """Interface implemented by every backend."""
+
+    def load_config(self):
+        """Returns the config dict, or None if the building has not been set up yet."""
+        raise NotImplementedError
+
+    def save_config(self, config):
+        raise NotImplementedError
+
+    def load_data(self):
+        """Returns (families, notices) as lists of dicts."""
+        raise NotImplementedError
+
+    def add_families(self, families):
+        """Stores a batch of families in one transaction. Families whose flat is already occupied
+        or whose email is taken are skipped. Returns the number stored."""
+        raise NotImplementedError
+
+    def add_notices(self, notices):
+        """Stores a batch of notices in one transaction."""
+        raise NotImplementedError
+
+    def add_family(self, family):
+        """Returns False if the family was skipped (flat occupied or email taken)."""
+        return self.add_families([family]) == 1
+
+    def add_notice(self, notice):
+        self.add_notices([notice])
+
+
+# -----------------------------
+# JSON files (original format)
+# -----------------------------
+
+class JSONStorage(StorageBackend):
+    def __init__(self, config_path="config.json", data_path="data.json"):
+        self.config_path = config_path
+        self.data_path = data_path
+
+    def load_config(self):
+        try:
+            with open(self.config_path, "r") as f:
+                config = json.load(f)
+            return {
+                "admin_email": config["admin_email"],
+                "admin_password_hash": config["admin_password_hash"],
+                "total_flats": config["total_flats"],
+            }
+        except (FileNotFoundError, KeyError):
+            return None
+
+    def save_config(self, config):
+        with open(self.config_path, "w") as f:
+            json.dump(config, f, indent=4)
+
+    def load_data(self):
+        try:
+            with open(self.data_path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return [], []
+        return data.get("families", []), data.get("notices", [])
+
+    def _save_data(self, families, notices):
+        with open(self.data_path, "w") as f:
+            json.dump({"families": families, "notices": notices}, f, indent=4)
+
+    def add_families(self, families):
+        existing, notices = self.load_data()
+        flats = {f["flat_no"].upper() for f in existing}
+        emails = {f["email"] for f in existing}
+        added = []
+        for f in families:
+            if f["flat_no"].upper() in flats or f["email"] in emails:
+                continue
+            added.append(f)
+            flats.add(f["flat_no"].upper())
+            emails.add(f["email"])
+        self._save_data(existing + added, notices)
+        return len(added)
+
+    def add_notices(self, notices):
+        families, existing = self.load_data()
+        self._save_data(families, existing + list(notices))
+
+
+# -----------------------------
+# SQLite (stdlib, no server needed)
+# -----------------------------
+
+class SQLiteStorage(StorageBackend):
+    def __init__(self, path="bms.db"):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS families (
+                    flat_no TEXT PRIMARY KEY,
+                    head_member TEXT,
+                    phone TEXT,
+                    members INTEGER,
+                    email TEXT UNIQUE,
+                    password_hash TEXT,
+                    nid TEXT
+                );
+                CREATE TABLE IF NOT EXISTS notices (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    date_posted TEXT
+                );
+            """)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """A connection that commits (or rolls back) on exit and is then closed; sqlite3's own
+        context manager only does the former."""
+        with contextlib.closing(sqlite3.connect(self.path)) as conn, conn:
+            yield conn
+
+    def load_config(self):
+        with self._connect() as conn:
+            rows = dict(conn.execute("SELECT key, value FROM config"))
+        if "admin_email" not in rows:
+            return None
+        return {
+            "admin_email": rows["admin_email"],
+            "admin_password_hash": rows["admin_password_hash"],
+            "total_flats": json.loads(rows.get("total_flats", "[]")),
+        }
+
+    def save_config(self, config):
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", [
+                ("admin_email", config["admin_email"]),
+                ("admin_password_hash", config["admin_password_hash"]),
+                ("total_flats", json.dumps(sorted(config["total_flats"]))),
+            ])
+
+    def load_data(self):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            families = [dict(r) for r in conn.execute(
+                "SELECT flat_no, head_member, phone, members, email, password_hash, nid FROM families"
+            )]
+            notices = [dict(r) for r in conn.execute("SELECT title, content, date_posted FROM notices ORDER BY id")]
+        return families, notices
+
+    def add_families(self, families):
+        with self._connect() as conn:
+            return conn.executemany(
+                "INSERT OR IGNORE INTO families (flat_no, head_member, phone, members, email, password_hash, nid) "
+                "VALUES (:flat_no, :head_member, :phone, :members, :email, :password_hash, :nid)",
+                families
+            ).rowcount
+
+    def add_notices(self, notices):
+        with self._connect() as conn:
+            return conn.executemany(
+                "INSERT INTO notices (title, content, date_posted) VALUES (:title, :content, :date_posted)",
+                notices
+            ).rowcount
+
+
+# -----------------------------
+# SQLAlchemy (the web app's User/Apartment/Notice tables)
+# -----------------------------
+
+def _floor_of(unit_number):
+    match = re.match(r"\d+", unit_number)
+    return int(match.group()) if match else None
+
+
+class SQLAlchemyStorage(StorageBackend):
+    """Reads and writes the same tables as app.py, so the CLI and the web app share one database.
+    Families are resident Users linked to an Apartment; the admin is the first admin User."""
+
+    def __init__(self, flask_app=None):
+        import app as web  # imported lazily: pulls in Flask and the database configuration
+        self.web = web
+        self.flask_app = flask_app or web.app
+
+    def load_config(self):
+        web = self.web
+        with self.flask_app.app_context():
+            admin = web.User.query.filter_by(role='admin').order_by(web.User.id).first()
+            if not admin:
+                return None
+            flats = [unit for (unit,) in web.Apartment.query.with_entities(web.Apartment.unit_number)]
+            return {
+                "admin_email": admin.email,
+                "admin_password_hash": admin.password_hash,
+                "total_flats": flats,
+            }
+
+    def save_config(self, config):
+        """Creates the admin if missing and any flats that don't exist yet. An existing admin keeps
+        its password: it is changed through the web app, and a re-run of `flask import-legacy`
+        must not roll it back to the CLI's old hash."""
+        web = self.web
+        with self.flask_app.app_context():
+            if not web.User.query.filter_by(email=config["admin_email"]).first():
+                web.db.session.add(web.User(full_name="System Admin", email=config["admin_email"], role="admin",
+                                            password_hash=config["admin_password_hash"], must_change_password=False))
+
+            existing = {unit for (unit,) in web.Apartment.query.with_entities(web.Apartment.unit_number)}
+            for unit in sorted(set(config["total_flats"]) - existing):
+                web.db.session.add(web.Apartment(unit_number=unit, floor=_floor_of(unit)))
+            web.db.session.commit()
+            web.vacancy_index.invalidate()
+
+    def load_data(self):
+        web = self.web
+        with self.flask_app.app_context():
+            residents = (
+                web.db.session.query(web.User, web.Apartment.unit_number)
+                .join(web.Apartment, web.Apartment.resident_id == web.User.id)
+                .filter(web.User.role == 'resident')
+                .all()
+            )
+            families = [{
+                "flat_no": unit,
+                "head_member": u.full_name,
+                "phone": u.phone,
+                "members": u.members_count,
+                "email": u.email,
+                "password_hash": u.password_hash,
+                "nid": u.nid,
+            } for u, unit in residents]
+            notices = [{
+                "title": n.title,
+                "content": n.content,
+                "date_posted": n.created_at.strftime(NOTICE_DATE_FORMAT) if n.created_at else None,
+            } for n in web.Notice.query.order_by(web.Notice.created_at.asc())]
+        return families, notices
+
+    def add_families(self, families):
+        web = self.web
+        with self.flask_app.app_context():
+            session = web.db.session
+            emails = [f["email"] for f in families]
+            flats = [f["flat_no"].upper() for f in families]
+            taken = {e for (e,) in session.query(web.User.email).filter(web.User.email.in_(emails))}
+            apartments = {a.unit_number: a for a in web.Apartment.query.filter(web.Apartment.unit_number.in_(flats))}
+
+            added = []
+            claimed = set()
+            for f in families:
+                apartment = apartments.get(f["flat_no"].upper())
+                if f["email"] in taken or not apartment or apartment.resident_id or apartment in claimed:
+                    continue  # already imported, unknown flat or flat occupied
+                user = web.User(
+                    full_name=f["head_member"],
+                    email=f["email"],
+                    password_hash=f["password_hash"],
+                    phone=f["phone"],
+                    nid=f["nid"],
+                    members_count=f["members"],
+                    role='resident',
+                    must_change_password=False
+                )
+                session.add(user)
+                added.append((user, apartment))
+                taken.add(f["email"])
+                claimed.add(apartment)
+            session.flush()
+            for user, apartment in added:
+                apartment.resident_id = user.id
+            if added:
+                # One change-log lock per batch, not one round trip per record
+                web.lock_change_log()
+                session.add_all([web.ChangeLog(entity='user', entity_id=user.id, op='upsert') for user, _ in added])
+            session.commit()
+            return len(added)
+
+    def add_notices(self, notices):
+        web = self.web
+        with self.flask_app.app_context():
+            session = web.db.session
+            rows = []
+            for n in notices:
+                created_at = (datetime.datetime.strptime(n["date_posted"], NOTICE_DATE_FORMAT)
+                              if n.get("date_posted") else datetime.datetime.utcnow())
+                rows.append(web.Notice(title=n["title"], content=n["content"], created_at=created_at))
+            session.add_all(rows)
+            session.flush()
+            if rows:
+                web.lock_change_log()
+                session.add_all([web.ChangeLog(entity='notice', entity_id=notice.id, op='upsert') for notice in rows])
+            session.commit()
+            return len(rows)
+
+
+def storage_from_env():
+    """Picks the backend from BMS_STORAGE: "json" (default), "sqlite" or "sqlalchemy"."""
+    kind = os.environ.get("BMS_STORAGE", "json")
+    if kind == "sqlite":
+        return SQLiteStorage(os.environ.get("BMS_SQLITE_PATH", "bms.db"))
+    if kind == "sqlalchemy":
+        return SQLAlchemyStorage()
+    return JSONStorage()
+
+
+# -----------------------------
+# Streaming importer
+# -----------------------------
+
+def iter_json_object(fp, chunk_size=1 << 16):
+    """Streams a top-level JSON object from `fp` without loading it whole.
+
+    Yields (key, item) for every element of top-level array values, and (key, value) for
+    any other top-level value. Only one element is held in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    def expect(chars):
+        nonlocal pos
+        skip_ws()
+        if pos >= len(buf) or buf[pos] not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {pos}")
+        pos += 1
+        return buf[pos - 1]
+
+    def decode():
+        # Only trust a decode that is followed by a delimiter (or EOF), so a number cut off
+        # at a chunk boundary ("3." of "3.25") is never accepted.
+        nonlocal pos
+        skip_ws()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                if (end < len(buf) and buf[end] in " \t\r\n,]}:") or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    expect("{")
+    skip_ws()
+    if buf[pos:pos + 1] == "}":
+        return
+    while True:
+        key = decode()
+        expect(":")
+        skip_ws()
+        if buf[pos:pos + 1] == "[":
+            pos += 1
+            skip_ws()
+            if buf[pos:pos + 1] == "]":
+                pos += 1
+            else:
+                while True:
+                    yield key, decode()
+                    if expect(",]") == "]":
+                        break
+        else:
+            yield key, decode()
+        if expect(",}") == "}":
+            return
+
+
+def _normalize_family(f):
+    return {
+        "flat_no": f["flat_no"].upper(),
+        "head_member": f["head_member"],
+        "phone": f["phone"],
+        "members": f["members"],
+        "email": f["email"],
+        "password_hash": f.get("password_hash"),
+        "nid": f["nid"],
+    }
+
+
+def import_legacy_json(storage, data_path="data.json", config_path="config.json", batch_size=1000):
+    """Copies a bms.py config.json + data.json into `storage`, one transaction per batch.
+
+    Password hashes are copied unchanged: bcrypt hashes keep working through
+    passwords.verify_password and are upgraded to Werkzeug hashes on the next web login.
+    Returns {"families": n, "notices": n}.
+    """
+    if config_path and os.path.exists(config_path):
+        with open(config_path, "r") as f:
+            config = json.load(f)
+        storage.save_config(config)
+
+    counts = {"families": 0, "notices": 0}
+    batches = {"families": [], "notices": []}
+
+    def flush(kind):
+        if not batches[kind]:
+            return
+        add = storage.add_families if kind == "families" else storage.add_notices
+        added = add(batches[kind])
+        counts[kind] += added if added is not None else len(batches[kind])
+        batches[kind] = []
+
+    with open(data_path, "r", encoding="utf-8") as f:
+        for key, item in iter_json_object(f):
+            if key == "families":
+                batches[key].append(_normalize_family(item))
+            elif key == "notices":
+                batches[key].append(item)
+            else:
+                continue
+            if len(batches[key]) >= batch_size:
+                flush(key)
+    flush("families")
+    flush("notices")
+    return counts
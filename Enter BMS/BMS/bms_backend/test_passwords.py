@@ -0,0 +1,63 @@
+"""Tests for the dual bcrypt/Werkzeug password checks in passwords.py.
+
+    python -m pytest test_passwords.py
+"""
+import os
+import tempfile
+
+import bcrypt
+import pytest
+from werkzeug.security import generate_password_hash
+
+from passwords import hash_password, is_bcrypt_hash, is_password_hash, verify_password
+
+BCRYPT_HASH = bcrypt.hashpw(b"s3cret", bcrypt.gensalt(rounds=4)).decode()
+WERKZEUG_HASH = generate_password_hash("s3cret")
+
+
+@pytest.mark.parametrize("stored", [BCRYPT_HASH, WERKZEUG_HASH, hash_password("s3cret")])
+def test_verify_password_accepts_both_schemes(stored):
+    assert verify_password(stored, "s3cret")
+    assert not verify_password(stored, "wrong")
+
+
+def test_bytes_hash_is_accepted():
+    assert verify_password(BCRYPT_HASH.encode(), "s3cret")
+    assert not verify_password(BCRYPT_HASH.encode(), "wrong")
+
+
+@pytest.mark.parametrize("stored", ["$2b$12$not-a-real-hash", "$2b$", "pbkdf2:sha256:1$bad"])
+def test_malformed_hash_is_rejected_without_raising(stored):
+    assert not verify_password(stored, "s3cret")
+
+
+@pytest.mark.parametrize("stored, password", [(BCRYPT_HASH, None), (WERKZEUG_HASH, None), (None, "s3cret"), ("", "s3cret")])
+def test_missing_hash_or_password_is_rejected(stored, password):
+    assert not verify_password(stored, password)
+
+
+def test_hash_detection():
+    assert is_bcrypt_hash(BCRYPT_HASH) and not is_bcrypt_hash(WERKZEUG_HASH)
+    assert is_password_hash(BCRYPT_HASH) and is_password_hash(WERKZEUG_HASH)
+    assert not is_password_hash("s3cret") and not is_password_hash(None)
+
+
+def test_login_upgrades_bcrypt_hash_to_werkzeug(monkeypatch):
+    monkeypatch.setenv('BMS_SERVER_MODE', 'asgi')
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bms.db'))
+    monkeypatch.setenv('JWT_SECRET_KEY', 'test-secret-key-that-is-long-enough')
+    from app import create_app, db, User
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(full_name="R", email="1a@bms.com", password_hash=BCRYPT_HASH, role='resident'))
+        db.session.commit()
+
+    client = app.test_client()
+    assert client.post('/login', json={"email": "1a@bms.com", "password": "wrong"}).status_code == 401
+    assert client.post('/login', json={"email": "1a@bms.com", "password": "s3cret"}).status_code == 200
+    with app.app_context():
+        upgraded = User.query.filter_by(email="1a@bms.com").first().password_hash
+    assert not is_bcrypt_hash(upgraded) and verify_password(upgraded, "s3cret")
+    assert client.post('/login', json={"email": "1a@bms.com", "password": "s3cret"}).status_code == 200
@@ -0,0 +1,141 @@
+"""Tests for the streaming JSON reader and the legacy importer in storage.py.
+
+    python -m pytest test_storage.py
+"""
+import io
+import json
+
+import pytest
+
+from storage import JSONStorage, SQLiteStorage, import_legacy_json, iter_json_object
+
+CHUNK_SIZES = [1, 2, 3, 7, 64, 1 << 16]
+
+
+def stream(document, chunk_size):
+    return list(iter_json_object(io.StringIO(document), chunk_size=chunk_size))
+
+
+def expected(document):
+    """What iter_json_object should yield, computed with json.loads."""
+    items = []
+    for key, value in json.loads(document).items():
+        if isinstance(value, list):
+            items.extend((key, item) for item in value)
+        else:
+            items.append((key, value))
+    return items
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_items_match_json_loads_at_every_chunk_boundary(chunk_size):
+    document = json.dumps({
+        "families": [
+            {"flat_no": "1A", "head_member": "A \"quoted\" name, with ] and }", "members": 4},
+            {"flat_no": "10B", "head_member": "Ünïcödé", "members": 2},
+        ],
+        "notices": [{"title": "t", "content": "line\nbreak", "date_posted": "2024-01-01 10:00"}],
+    }, indent=4)
+    assert stream(document, chunk_size) == expected(document)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_numbers_split_across_chunks(chunk_size):
+    document = '{"n": [3.25e10, -17, 1.5, 0, 12345678901234567890], "x": -0.125e-3}'
+    assert stream(document, chunk_size) == expected(document)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("document", ['{}', ' { } ', '{"families": [], "notices": [ ]}', '{"families":[]}'])
+def test_empty_objects_and_arrays_yield_nothing(document, chunk_size):
+    assert stream(document, chunk_size) == []
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_non_array_values_are_yielded_whole(chunk_size):
+    document = '{"version": 2, "meta": {"tags": [1, 2]}, "name": "bms", "flag": true, "none": null, "families": [1]}'
+    assert stream(document, chunk_size) == [
+        ("version", 2), ("meta", {"tags": [1, 2]}), ("name", "bms"), ("flag", True), ("none", None), ("families", 1)
+    ]
+
+
+@pytest.mark.parametrize("document", ['[1, 2]', '{"families": [1, 2}', '{"families": [1, 2]', '{"n": 3.2'])
+def test_malformed_input_raises(document):
+    with pytest.raises(ValueError):
+        stream(document, 2)
+
+
+@pytest.fixture
+def legacy_files(tmp_path):
+    config = {"admin_email": "admin@bms.com", "admin_password_hash": "$2b$12$abc", "total_flats": ["1A", "1B", "2A"]}
+    families = [
+        {"flat_no": "1a", "head_member": "Rahim", "phone": "017", "members": 4,
+         "email": "1a@bms.com", "password_hash": "$2b$12$def", "nid": "111"},
+        {"flat_no": "2A", "head_member": "Karim", "phone": "018", "members": 2,
+         "email": "2a@bms.com", "password_hash": "$2b$12$ghi", "nid": "222"},
+    ]
+    notices = [
+        {"title": "Water", "content": "Off at 10", "date_posted": "2024-01-01 10:00"},
+        {"title": "Lift", "content": "Serviced", "date_posted": "2024-02-01 09:30"},
+        {"title": "Gas", "content": "Checked", "date_posted": "2024-03-01 08:15"},
+    ]
+    source = JSONStorage(str(tmp_path / "config.json"), str(tmp_path / "data.json"))
+    source.save_config(config)
+    source.add_families(families)
+    source.add_notices(notices)
+    return source
+
+
+def test_json_to_sqlite_round_trip(legacy_files, tmp_path):
+    target = SQLiteStorage(str(tmp_path / "bms.db"))
+    counts = import_legacy_json(target, legacy_files.data_path, legacy_files.config_path, batch_size=2)
+
+    assert counts == {"families": 2, "notices": 3}
+    assert target.load_config() == legacy_files.load_config()
+    families, notices = target.load_data()
+    source_families, source_notices = legacy_files.load_data()
+    assert sorted(families, key=lambda f: f["flat_no"]) == [
+        dict(f, flat_no=f["flat_no"].upper()) for f in source_families
+    ]
+    assert notices == source_notices
+
+
+def test_reimport_skips_existing_families(legacy_files, tmp_path):
+    target = SQLiteStorage(str(tmp_path / "bms.db"))
+    import_legacy_json(target, legacy_files.data_path, legacy_files.config_path)
+    counts = import_legacy_json(target, legacy_files.data_path, legacy_files.config_path)
+
+    assert counts["families"] == 0
+    assert len(target.load_data()[0]) == 2
+
+
+def family(flat_no, email):
+    return {"flat_no": flat_no, "head_member": "H", "phone": "1", "members": 1,
+            "email": email, "password_hash": "$2b$12$abc", "nid": "1"}
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_add_family_reports_occupied_flat_and_taken_email(backend, tmp_path):
+    if backend == "json":
+        storage = JSONStorage(str(tmp_path / "config.json"), str(tmp_path / "data.json"))
+    else:
+        storage = SQLiteStorage(str(tmp_path / "bms.db"))
+
+    assert storage.add_family(family("1A", "1a@bms.com"))
+    assert not storage.add_family(family("1A", "other@bms.com"))
+    assert not storage.add_family(family("1B", "1a@bms.com"))
+    assert [f["flat_no"] for f in storage.load_data()[0]] == ["1A"]
+
+
+def test_building_system_does_not_keep_a_family_storage_rejected(tmp_path, capsys):
+    from bms import BuildingSystem
+
+    storage = SQLiteStorage(str(tmp_path / "bms.db"))
+    storage.save_config({"admin_email": "admin@bms.com", "admin_password_hash": "$2b$12$abc", "total_flats": ["1A"]})
+    system = BuildingSystem(storage=storage)
+    storage.add_family(family("1A", "web@bms.com"))  # assigned elsewhere after the CLI loaded its data
+
+    system.add_family("1A", "H", "1", 1, "cli@bms.com", "pw", "1")
+
+    assert system.families == []
+    assert "already occupied" in capsys.readouterr().out
@@ -3,7 +3,12 @@ import { io } from "socket.io-client";
 
 // ─── CONFIG ──────────────────────────────────────────────────────────────────
 const API = "https://your-backend.onrender.com"; // ← REPLACE with your Render URL
-const socket = io(API, { transports: ["websocket", "polling"] });
+// The server authenticates the socket once at connect time, so only connect after login
+const socket = io(API, {
+  transports: ["websocket", "polling"],
+  autoConnect: false,
+  auth: (cb) => cb({ token: localStorage.getItem("bms_token") }),
+});
 
 // ─── AUTH CONTEXT ─────────────────────────────────────────────────────────────
 const AuthContext = createContext(null);
@@ -767,7 +772,10 @@ export default function App() {
       authFetch("/api/user_info")
         .then(r => r.json())
         .then(data => {
-          if (data.status === "success") setUser({ role: data.role, full_name: data.full_name });
+          if (data.status === "success") {
+            setUser({ role: data.role, full_name: data.full_name });
+            socket.connect();
+          }
         })
         .catch(() => {})
         .finally(() => setChecking(false));
@@ -776,7 +784,7 @@ export default function App() {
     }
   }, []);
 
-  const handleLogin = (userData) => { setUser(userData); setActive("dashboard"); };
+  const handleLogin = (userData) => { setUser(userData); setActive("dashboard"); socket.connect(); };
   const handleLogout = () => { localStorage.removeItem("bms_token"); setUser(null); socket.disconnect(); };
 
   if (checking) {